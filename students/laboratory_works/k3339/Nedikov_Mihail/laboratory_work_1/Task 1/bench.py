@@ -0,0 +1,94 @@
+import os
+import selectors
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+from server import HOST, PORT
+
+# Нагрузочный клиент для UDP-сервера: держит на каждом сокете окно
+# неотвеченных запросов и считает ответы в секунду. Запуск:
+#   python bench.py [секунд] [сокетов] [окно] [режим ...]
+# Режимы: simple, fast1, fast4 и т. п. — бенчмарк сам запускает server.py.
+# Режим none — без запуска, против уже работающего сервера.
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+REQUEST = b"Hello, server"
+LOSS_TIMEOUT = 0.2  # столько ждём ответа, прежде чем считать окно потерянным
+
+
+def start_server(mode):
+    """Запускает server.py в нужном режиме в отдельной группе процессов."""
+    args = [sys.executable, os.path.join(BASE_DIR, "server.py")]
+    if mode.startswith("fast"):
+        args += ["fast", mode[len("fast"):] or str(os.cpu_count())]
+    proc = subprocess.Popen(
+        args, stdout=subprocess.DEVNULL, cwd=BASE_DIR, start_new_session=True
+    )
+    time.sleep(0.5)
+    return proc
+
+
+def load(seconds, sockets, window):
+    """Гоняет запросы seconds секунд; возвращает (ответов, потерянных)."""
+    address = socket.getaddrinfo(HOST, PORT, socket.AF_INET, socket.SOCK_DGRAM)[0][4]
+    sel = selectors.DefaultSelector()
+    inflight = {}
+    for _ in range(sockets):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setblocking(False)
+        sock.connect(address)  # у каждого сокета свой порт — ядро разносит их по воркерам
+        sel.register(sock, selectors.EVENT_READ)
+        inflight[sock] = 0
+    buf = bytearray(2048)
+    replies = lost = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        for sock, count in inflight.items():
+            for _ in range(window - count):
+                try:
+                    sock.send(REQUEST)
+                except BlockingIOError:
+                    break
+                inflight[sock] += 1
+        events = sel.select(LOSS_TIMEOUT)
+        if not events:
+            # Ответов нет дольше LOSS_TIMEOUT: считаем окна потерянными.
+            lost += sum(inflight.values())
+            inflight = dict.fromkeys(inflight, 0)
+            continue
+        for key, _ in events:
+            sock = key.fileobj
+            while inflight[sock]:
+                try:
+                    sock.recv_into(buf)
+                except (BlockingIOError, ConnectionRefusedError):
+                    break
+                inflight[sock] -= 1
+                replies += 1
+    for sock in inflight:
+        sel.unregister(sock)
+        sock.close()
+    return replies, lost
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3
+    sockets = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    window = int(sys.argv[3]) if len(sys.argv) > 3 else 32
+    modes = sys.argv[4:] or ["simple", "fast1", f"fast{os.cpu_count()}"]
+    print(f"{sockets} сокетов, окно {window}, {seconds} с на режим, ядер: {os.cpu_count()}")
+    for mode in modes:
+        proc = start_server(mode) if mode != "none" else None
+        try:
+            replies, lost = load(seconds, sockets, window)
+        finally:
+            if proc is not None:
+                os.killpg(proc.pid, signal.SIGKILL)
+                proc.wait()
+        print(f"  {mode:<8}{replies / seconds:10.0f} ответов/с, потеряно {lost}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+from rpc import ReliableClient, RequestTimeout
+from server import HOST, PORT
+
+# Бенчмарк надёжного запроса-ответа: сколько запросов в секунду проходит
+# при разном окне и сколько повторов нужно при потерях. Запуск:
+#   python bench_rpc.py [запросов] [доля потерь ...]
+# Для каждой доли потерь бенчмарк сам запускает server.py fast 1 --loss P.
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+REQUEST = b"Hello, server"
+WINDOWS = (1, 8, 64)
+
+
+def start_server(loss):
+    """Запускает быстрый режим сервера с имитацией потерь."""
+    args = [sys.executable, os.path.join(BASE_DIR, "server.py"), "fast", "1", "--loss", str(loss)]
+    proc = subprocess.Popen(
+        args, stdout=subprocess.DEVNULL, cwd=BASE_DIR, start_new_session=True
+    )
+    time.sleep(0.5)
+    return proc
+
+
+def run(count, window):
+    """Отправляет count запросов окном window; возвращает (секунд, повторов, без ответа)."""
+    address = socket.getaddrinfo(HOST, PORT, socket.AF_INET, socket.SOCK_DGRAM)[0][4]
+    client = ReliableClient(address, window=window)
+    try:
+        start = time.perf_counter()
+        results = client.request_many([REQUEST] * count)
+        elapsed = time.perf_counter() - start
+    finally:
+        client.close()
+    failed = sum(isinstance(result, RequestTimeout) for result in results)
+    return elapsed, client.retransmits, failed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    losses = [float(arg) for arg in sys.argv[2:]] or [0.0, 0.01, 0.1]
+    print(f"{count} запросов на прогон")
+    for loss in losses:
+        proc = start_server(loss)
+        try:
+            for window in WINDOWS:
+                elapsed, retransmits, failed = run(count, window)
+                print(
+                    f"  потери {loss:<5} окно {window:<3}{count / elapsed:10.0f} запросов/с,"
+                    f" повторов {retransmits}, без ответа {failed}"
+                )
+        finally:
+            os.killpg(proc.pid, signal.SIGKILL)
+            proc.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,17 @@
-import socket
+from rpc import ReliableClient, RequestTimeout
+from server import HOST, PORT
 
-# UDP-клиент отправляет текст и печатает ответ от сервера.
-client_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+# UDP-клиент отправляет текст и печатает ответ от сервера. Запрос идёт с
+# номером; если ответ потерялся, клиент повторяет его с растущей паузой.
+client = ReliableClient((HOST, PORT))
 
 # Формируем и отправляем запрос серверу.
 request = "Hello, server"
-client_socket.sendto(request.encode(), ("localhost", 8080))
-
-# Получаем ответ и выводим его в консоль.
-response, address = client_socket.recvfrom(1024)
-
-print(response.decode())
+try:
+    # Получаем ответ и выводим его в консоль.
+    response = client.request(request.encode())
+    print(response.decode())
+except RequestTimeout:
+    print("Сервер не ответил")
+finally:
+    client.close()
@@ -0,0 +1,182 @@
+import heapq
+import selectors
+import socket
+import struct
+import time
+from collections import OrderedDict
+
+# Надёжный запрос-ответ поверх UDP. Датаграмма начинается с заголовка:
+# два байта метки (запрос или ответ) и номер запроса uint32. Датаграммы без
+# метки сервер обрабатывает по-старому, так что простой клиент тоже работает.
+HEADER = struct.Struct(">2sI")
+REQUEST_TAG = b"RQ"
+RESPONSE_TAG = b"RS"
+TIMEOUT = 0.2  # первое ожидание ответа, секунд
+BACKOFF = 2  # множитель ожидания после каждого повтора
+MAX_TIMEOUT = 2.0
+RETRIES = 5  # повторов после первой отправки
+WINDOW = 64  # запросов в полёте с одного сокета
+DEDUP_SIZE = 10000  # ответов в кэше сервера
+DEDUP_TTL = 30.0  # секунд храним ответ для повторов
+
+
+class RequestTimeout(Exception):
+    """Ответ не пришёл ни на одну из попыток."""
+
+
+class DedupCache:
+    """Ответы на недавние запросы с ограничением по размеру и по времени.
+
+    Время жизни у всех записей одно, поэтому порядок вставки совпадает с
+    порядком истечения: устаревшие и лишние записи всегда в начале
+    OrderedDict, и вытеснение стоит O(1) на запись.
+    """
+
+    def __init__(self, max_size=DEDUP_SIZE, ttl=DEDUP_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()  # ключ -> (истекает, ответ)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, now):
+        entry = self.entries.get(key)
+        if entry is None or entry[0] <= now:
+            return None
+        return entry[1]
+
+    def put(self, key, response, now):
+        self.entries[key] = (now + self.ttl, response)
+        self.entries.move_to_end(key)
+        while self.entries:
+            oldest = next(iter(self.entries.values()))
+            if len(self.entries) <= self.max_size and oldest[0] > now:
+                break
+            self.entries.popitem(last=False)
+
+
+class Responder:
+    """Серверная часть: отвечает на датаграммы и повторяет сохранённые ответы.
+
+    Повторный запрос (тот же адрес и номер) получает ответ из кэша, и
+    handler не вызывается второй раз.
+    """
+
+    def __init__(self, handler, cache=None):
+        self.handler = handler
+        self.cache = cache if cache is not None else DedupCache()
+        self.duplicates = 0
+
+    def respond(self, data, address, now):
+        """Возвращает байты ответа на датаграмму data от address."""
+        if len(data) < HEADER.size or data[:2] != REQUEST_TAG:
+            return self.handler(data)
+        seq = HEADER.unpack_from(data)[1]
+        key = (address, seq)
+        response = self.cache.get(key, now)
+        if response is not None:
+            self.duplicates += 1
+            return response
+        response = HEADER.pack(RESPONSE_TAG, seq) + self.handler(data[HEADER.size:])
+        self.cache.put(key, response, now)
+        return response
+
+
+class ReliableClient:
+    """Клиент с номерами запросов, таймаутами и повторами с ростом паузы.
+
+    С одного сокета в полёте может быть до window запросов; ответы
+    сопоставляются по номеру, поэтому потерянный запрос не задерживает
+    остальные.
+    """
+
+    def __init__(self, address, timeout=TIMEOUT, retries=RETRIES, window=WINDOW):
+        self.address = address
+        self.timeout = timeout
+        self.retries = retries
+        self.window = window
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.connect(address)
+        self.sock.setblocking(False)
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.sock, selectors.EVENT_READ)
+        self.next_seq = 0
+        self.retransmits = 0
+        self._buf = bytearray(65536)
+
+    def close(self):
+        self.selector.close()
+        self.sock.close()
+
+    def request(self, payload):
+        """Один запрос; возвращает тело ответа или бросает RequestTimeout."""
+        result = self.request_many([payload])[0]
+        if isinstance(result, RequestTimeout):
+            raise result
+        return result
+
+    def request_many(self, payloads):
+        """Отправляет все запросы окном и возвращает ответы в том же порядке.
+
+        На месте запроса, оставшегося без ответа после всех повторов,
+        в списке лежит RequestTimeout.
+        """
+        results = [None] * len(payloads)
+        pending = {}  # seq -> [индекс, датаграмма, попытка]
+        deadlines = []  # куча (срок, seq, попытка); устаревшие записи пропускаются
+        next_index = 0
+        done = 0
+        while done < len(payloads):
+            while next_index < len(payloads) and len(pending) < self.window:
+                seq = self.next_seq = (self.next_seq + 1) % 2**32
+                datagram = HEADER.pack(REQUEST_TAG, seq) + payloads[next_index]
+                pending[seq] = [next_index, datagram, 0]
+                self._send(datagram)
+                heapq.heappush(deadlines, (time.monotonic() + self.timeout, seq, 0))
+                next_index += 1
+
+            wait = max(0.0, deadlines[0][0] - time.monotonic()) if deadlines else None
+            if self.selector.select(wait):
+                done += self._receive(pending, results)
+
+            now = time.monotonic()
+            while deadlines and deadlines[0][0] <= now:
+                _, seq, attempt = heapq.heappop(deadlines)
+                entry = pending.get(seq)
+                if entry is None or entry[2] != attempt:
+                    continue  # уже ответили или запрос переотправлен позже
+                if attempt >= self.retries:
+                    del pending[seq]
+                    results[entry[0]] = RequestTimeout(f"no reply to request {seq}")
+                    done += 1
+                    continue
+                entry[2] = attempt + 1
+                self.retransmits += 1
+                self._send(entry[1])
+                delay = min(self.timeout * BACKOFF ** entry[2], MAX_TIMEOUT)
+                heapq.heappush(deadlines, (now + delay, seq, entry[2]))
+        return results
+
+    def _send(self, datagram):
+        try:
+            self.sock.send(datagram)
+        except (BlockingIOError, ConnectionRefusedError):
+            pass  # считаем потерянной: отправим снова по таймауту
+
+    def _receive(self, pending, results):
+        """Забирает все пришедшие ответы; возвращает число завершённых запросов."""
+        done = 0
+        while True:
+            try:
+                size = self.sock.recv_into(self._buf)
+            except (BlockingIOError, ConnectionRefusedError):
+                return done
+            if size < HEADER.size or self._buf[:2] != RESPONSE_TAG:
+                continue
+            seq = HEADER.unpack_from(self._buf)[1]
+            entry = pending.pop(seq, None)
+            if entry is None:
+                continue  # дубль ответа на уже завершённый запрос
+            results[entry[0]] = bytes(self._buf[HEADER.size:size])
+            done += 1
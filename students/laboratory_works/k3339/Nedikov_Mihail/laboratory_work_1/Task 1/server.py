@@ -1,16 +1,136 @@
+import multiprocessing
+import os
+import random
 import socket
+import sys
+import time
 
-# UDP-сервер принимает сообщения от клиентов и отвечает фиксированной строкой.
-server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+from rpc import HEADER, REQUEST_TAG, Responder
 
-# Привязываем сокет к адресу localhost:8080.
-server_socket.bind(("localhost", 8080))
+# Адрес UDP-сервера и фиксированный ответ клиенту.
+HOST, PORT = "localhost", 8080
+RESPONSE = b"Hello, client"
+BUFFER_SIZE = 1024  # как и раньше, датаграммы длиннее обрезаются
+BATCH = 64  # столько датаграмм забираем из сокета за один проход
+RCVBUF = 4 * 1024 * 1024  # запас на всплески, чтобы ядро не отбрасывало пакеты
+LOSS = 0.0  # доля входящих датаграмм, которые сервер "теряет" (--loss, для проверки повторов)
 
-while True:
-    # Ждём сообщение от клиента и выводим его тело.
-    request, address = server_socket.recvfrom(1024)
-    print(request.decode())
 
-    # Отправляем ответ тому же клиенту.
-    response = "Hello, client"
-    server_socket.sendto(response.encode(), address)
+def handle(payload):
+    """Ответ на тело запроса; повторы одного запроса сюда не доходят."""
+    return RESPONSE
+
+
+def lost():
+    """Имитирует потерю датаграммы с вероятностью LOSS."""
+    return LOSS and random.random() < LOSS
+
+
+def body(data):
+    """Текст запроса без заголовка надёжного протокола, для печати."""
+    if data[:2] == REQUEST_TAG:
+        data = data[HEADER.size:]
+    return str(data, "utf-8", "replace")
+
+
+def make_socket(reuse_port=False):
+    """Создаёт UDP-сокет на HOST:PORT; с reuse_port порт делят несколько процессов."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RCVBUF)
+    sock.bind((HOST, PORT))
+    return sock
+
+
+def serve_simple(sock):
+    """Исходный режим: одна датаграмма за раз и её текст в консоли."""
+    responder = Responder(handle)
+    while True:
+        # Ждём сообщение от клиента и выводим его тело.
+        request, address = sock.recvfrom(BUFFER_SIZE)
+        if lost():
+            continue
+        print(body(request))
+
+        # Отправляем ответ тому же клиенту.
+        sock.sendto(responder.respond(request, address, time.monotonic()), address)
+
+
+def serve_fast(sock, log=False):
+    """Быстрый режим: датаграммы читаются пачками в заранее выделенные буферы.
+
+    В модуле socket нет recvmmsg/sendmmsg, поэтому пачка собирается так:
+    первый recvfrom_into ждёт данные, следующие идут с MSG_DONTWAIT, пока
+    очередь сокета не опустеет или не наберётся BATCH датаграмм. Новых
+    объектов bytes на входящие пакеты не создаётся; печать — только с log.
+    """
+    responder = Responder(handle)
+    views = [memoryview(bytearray(BUFFER_SIZE)) for _ in range(BATCH)]
+    sizes = [0] * BATCH
+    addresses = [None] * BATCH
+    while True:
+        sizes[0], addresses[0] = sock.recvfrom_into(views[0])
+        count = 1
+        while count < BATCH:
+            try:
+                sizes[count], addresses[count] = sock.recvfrom_into(
+                    views[count], 0, socket.MSG_DONTWAIT
+                )
+            except BlockingIOError:
+                break
+            count += 1
+        now = time.monotonic()
+        for i in range(count):
+            if lost():
+                continue
+            request = views[i][:sizes[i]]
+            if log:
+                print(body(request))
+            sock.sendto(responder.respond(request, addresses[i], now), addresses[i])
+
+
+def run_worker(log, loss):
+    """Процесс-воркер быстрого режима со своим сокетом на общем порту."""
+    global LOSS
+    LOSS = loss
+    try:
+        serve_fast(make_socket(reuse_port=True), log)
+    except KeyboardInterrupt:
+        pass
+
+
+def main():
+    """python server.py — исходный режим с печатью каждого сообщения;
+    python server.py fast [воркеры] [--log] — быстрый режим: воркеры
+    делят порт через SO_REUSEPORT, ядро распределяет клиентов между ними.
+    --loss P в любом режиме отбрасывает долю P входящих датаграмм.
+    """
+    global LOSS
+    args = sys.argv[1:]
+    log = "--log" in args
+    if log:
+        args.remove("--log")
+    if "--loss" in args:
+        i = args.index("--loss")
+        LOSS = float(args[i + 1])
+        del args[i:i + 2]
+    if not args or args[0] != "fast":
+        print(f"UDP-сервер слушает {HOST}:{PORT}")
+        serve_simple(make_socket())
+        return
+
+    workers = int(args[1]) if len(args) > 1 else os.cpu_count()
+    print(f"UDP-сервер (быстрый режим, воркеров: {workers}) слушает {HOST}:{PORT}")
+    procs = [multiprocessing.Process(target=run_worker, args=(log, LOSS)) for _ in range(workers)]
+    for proc in procs:
+        proc.start()
+    try:
+        for proc in procs:
+            proc.join()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
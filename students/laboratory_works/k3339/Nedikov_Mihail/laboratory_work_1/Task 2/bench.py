@@ -0,0 +1,106 @@
+import math
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from server import HOST, PORT, hypot_batch, numpy
+
+# Сравнение пропускной способности сервера гипотенуз. Запуск:
+#   python bench.py [пар] [соединений]
+# Бенчмарк сам запускает server.py. Режимы:
+#   соединение — как исходный клиент: новое соединение на каждую пару;
+#   по строке  — одно соединение, следующая пара после ответа на предыдущую;
+#   поток      — пары идут непрерывным потоком, ответы читаются параллельно.
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def make_lines(count):
+    return [f"{random.uniform(0, 1000)} {random.uniform(0, 1000)}\n".encode() for _ in range(count)]
+
+
+def per_connection(lines):
+    for line in lines:
+        with socket.create_connection((HOST, PORT)) as sock:
+            sock.sendall(line)
+            sock.makefile("rb").readline()
+
+
+def per_line(lines):
+    with socket.create_connection((HOST, PORT)) as sock:
+        reader = sock.makefile("rb")
+        for line in lines:
+            sock.sendall(line)
+            reader.readline()
+
+
+def streamed(lines):
+    with socket.create_connection((HOST, PORT)) as sock:
+        def send():
+            sock.sendall(b"".join(lines))
+            sock.shutdown(socket.SHUT_WR)
+
+        sender = threading.Thread(target=send)
+        sender.start()
+        received = sock.makefile("rb").read().count(b"\n")
+        sender.join()
+    assert received == len(lines), received
+
+
+def concurrent(mode, lines, connections):
+    """Запускает mode на connections соединениях, деля пары между ними."""
+    threads = [
+        threading.Thread(target=mode, args=(lines[i::connections],)) for i in range(connections)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    connections = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    lines = make_lines(count)
+
+    # Только вычисление, без сети.
+    xs = [random.uniform(0, 1000) for _ in range(count)]
+    ys = [random.uniform(0, 1000) for _ in range(count)]
+    start = time.perf_counter()
+    for x, y in zip(xs, ys):
+        math.sqrt(x ** 2 + y ** 2)
+    single = time.perf_counter() - start
+    start = time.perf_counter()
+    hypot_batch(xs, ys)
+    batch = time.perf_counter() - start
+    print(f"{count} пар, NumPy: {'да' if numpy else 'нет'}")
+    print(f"  вычисление по одной {count / single:12.0f} пар/с")
+    print(f"  вычисление пачкой   {count / batch:12.0f} пар/с")
+
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(BASE_DIR, "server.py")],
+        stdout=subprocess.DEVNULL, cwd=BASE_DIR, start_new_session=True,
+    )
+    time.sleep(0.5)
+    try:
+        # Соединение на пару заметно медленнее, поэтому для него пар меньше.
+        for name, mode, n in (
+            ("соединение", per_connection, min(count, 2000)),
+            ("по строке", per_line, count),
+            ("поток", streamed, count),
+        ):
+            start = time.perf_counter()
+            concurrent(mode, lines[:n], connections)
+            elapsed = time.perf_counter() - start
+            print(f"  {name:<11}x{connections} {n / elapsed:12.0f} пар/с")
+    finally:
+        os.killpg(proc.pid, signal.SIGKILL)
+        proc.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -8,12 +8,12 @@ client_socket.connect(("localhost", 8080))
 
 data = input("Введите два числа через пробел (например, 3 4): ")
 
-# Отправляем введенные данные на сервер.
-client_socket.sendall(data.encode())
+# Отправляем введенные данные на сервер; строки разделяются "\n".
+client_socket.sendall(data.encode() + b"\n")
 
 # Получаем строку-ответ с результатом и показываем ее пользователю.
-response = client_socket.recv(1024)
-print(response.decode())
+response = client_socket.makefile("rb").readline()
+print(response.decode().rstrip("\n"))
 
 # Закрываем соединение.
 client_socket.close()
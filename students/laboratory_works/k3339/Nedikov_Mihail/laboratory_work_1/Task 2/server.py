@@ -1,28 +1,99 @@
-import socket
 import math
+import socket
+import threading
+
+try:
+    import numpy
+except ImportError:  # без NumPy считаем тем же math.hypot в цикле
+    numpy = None
+
+# TCP-сервер считает гипотенузы. Клиент шлёт пары чисел строками через "\n"
+# сколько угодно раз в одном соединении, ответы идут строками в том же
+# порядке. Все целые строки из одного recv считаются одной пачкой.
+HOST, PORT = "localhost", 8080
+BUFFER_SIZE = 64 * 1024
+MAX_LINE = 1024  # строка без "\n" длиннее этого — ошибка протокола
+
+
+def parse(line):
+    """Разбирает строку "a b" в два неотрицательных числа."""
+    numbers = list(map(float, line.split()))
+    if len(numbers) != 2:
+        raise ValueError("Нужно ввести ровно два числа.")
+    if numbers[0] < 0 or numbers[1] < 0:
+        raise ValueError("Числа должны быть неотрицательными.")
+    return numbers
+
+
+def hypot_batch(xs, ys):
+    """Гипотенузы для списков катетов: с NumPy одним векторным вызовом."""
+    if numpy is not None:
+        return numpy.hypot(numpy.array(xs), numpy.array(ys)).tolist()
+    return list(map(math.hypot, xs, ys))
 
-# TCP-сервер принимает соединение, читает два числа и считает гипотенузу.
-server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 
-# Привязываем сокет и переводим его в режим прослушивания.
-server_socket.bind(("localhost", 8080))
-server_socket.listen(1)
+def compute(lines):
+    """Возвращает строку-ответ на каждую строку запроса, в том же порядке."""
+    results = [None] * len(lines)
+    xs, ys, slots = [], [], []
+    for i, line in enumerate(lines):
+        try:
+            x, y = parse(line)
+        except ValueError as error:
+            results[i] = f"Ошибка: {error}"
+            continue
+        xs.append(x)
+        ys.append(y)
+        slots.append(i)
+    for i, value in zip(slots, hypot_batch(xs, ys)):
+        results[i] = str(value)
+    return results
 
-while True:
-    # Ждём клиента и считываем строку с числами.
-    client_connection, client_address = server_socket.accept()
-    request = client_connection.recv(1024).decode()
 
+def answer(conn, data):
+    """Считает пачку строк из data и отправляет ответы одним sendall."""
+    lines = data.decode("utf-8", "replace").split("\n")
+    conn.sendall(("\n".join(compute(lines)) + "\n").encode())
+
+
+def handle_client(conn):
+    """Читает строки клиента до закрытия соединения и отвечает пачками."""
+    pending = bytearray()
     try:
-        numbers = list(map(float, request.split()))
-        if len(numbers) != 2:
-            raise ValueError("Нужно ввести ровно два числа.")
-        if any(n < 0 for n in numbers):
-            raise ValueError("Числа должны быть неотрицательными.")
-        result = str(math.sqrt(numbers[0] ** 2 + numbers[1] ** 2))
-    except ValueError as error:
-        result = f"Ошибка: {error}"
-
-    # Отправляем ответ клиенту и закрываем соединение.
-    client_connection.sendall(result.encode())
-    client_connection.close()
+        while True:
+            chunk = conn.recv(BUFFER_SIZE)
+            if not chunk:
+                break
+            pending += chunk
+            end = pending.rfind(b"\n")
+            if end < 0:
+                if len(pending) > MAX_LINE:
+                    conn.sendall("Ошибка: слишком длинная строка.\n".encode())
+                    return
+                continue
+            answer(conn, pending[:end])
+            del pending[:end + 1]
+        # Последняя строка может прийти без "\n" перед закрытием записи.
+        if pending.strip():
+            answer(conn, pending)
+    except (ConnectionResetError, BrokenPipeError):
+        pass
+    finally:
+        conn.close()
+
+
+def main():
+    """Принимает клиентов и обслуживает каждого в отдельном потоке."""
+    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server_socket.bind((HOST, PORT))
+    server_socket.listen(128)
+    print(f"Сервер гипотенуз слушает {HOST}:{PORT}, NumPy: {'да' if numpy else 'нет'}")
+
+    while True:
+        client_connection, client_address = server_socket.accept()
+        threading.Thread(target=handle_client, args=(client_connection,), daemon=True).start()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,41 +1,316 @@
-import socket
+import atexit
+import gzip
+import hashlib
+import mimetypes
 import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import zlib
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import unquote, urlsplit
 
 # Адрес, на котором запускаем HTTP-сервер.
 HOST = "localhost"
 PORT = 8080
 
-# Создаем TCP-сокет и переводим его в режим прослушивания.
-server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-server_socket.bind((HOST, PORT))
-server_socket.listen(5)
-
-# Папка с index.html, который будем отдавать клиенту.
-base_dir = os.path.dirname(os.path.abspath(__file__))
-file_path = os.path.join(base_dir, "index.html")
-
-while True:
-    # Принимаем клиента и выводим информацию о подключении.
-    client_connection, client_address = server_socket.accept()
-    print(f"Подключился клиент {client_address}")
-
-    # Читаем первый запрос и показываем его в консоли.
-    request = client_connection.recv(1024).decode()
-    print(f"Запрос клиента:\n{request}")
-
-    # Читаем HTML-файл и формируем HTTP-ответ.
-    with open(file_path, "r", encoding="utf-8") as file:
-        html_content = file.read()
-
-    http_response = (
-        "HTTP/1.1 200 OK\r\n"
-        "Content-Type: text/html; charset=UTF-8\r\n"
-        f"Content-Length: {len(html_content.encode('utf-8'))}\r\n"
-        "Connection: close\r\n"
-        "\r\n"
-        + html_content
-    )
-
-    # Отправляем ответ и закрываем соединение.
-    client_connection.sendall(http_response.encode("utf-8"))
-    client_connection.close()
+# Папка, из которой раздаются файлы. Только отдельная папка static: из
+# папки скрипта ушли бы наружу и исходники сервера. Меняется аргументом.
+ROOT_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "static")
+MAX_REQUEST = 8 * 1024
+
+# Сжатые копии файлов хранятся на диске, чтобы их тоже отдавать через sendfile.
+# Папка своя у каждого процесса (mkdtemp, права 0700): в общей папке /tmp
+# чужой пользователь мог бы подложить симлинк или свою «сжатую копию».
+# Создаётся при первом сжатии и удаляется при выходе.
+VARIANT_DIR = None
+COMPRESS_MIN_SIZE = 1024
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "image/svg+xml")
+ENCODINGS = ("gzip", "deflate")  # в порядке предпочтения сервера
+
+# Кэш метаданных файлов: путь -> (mtime_ns, размер, Content-Type, Last-Modified).
+# Запись считается актуальной, пока у файла не изменились mtime и размер.
+meta_cache = {}
+# Кэш сжатых копий: (путь, кодирование) -> (mtime_ns, размер, путь копии, размер копии).
+variant_cache = {}
+variant_lock = threading.Lock()
+
+
+def file_meta(path):
+    """Возвращает метаданные файла, пересчитывая их только после его изменения."""
+    st = os.stat(path)
+    meta = meta_cache.get(path)
+    if meta is None or meta[0] != st.st_mtime_ns or meta[1] != st.st_size:
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if content_type.startswith("text/"):
+            content_type += "; charset=UTF-8"
+        meta = (st.st_mtime_ns, st.st_size, content_type, formatdate(st.st_mtime, usegmt=True))
+        meta_cache[path] = meta
+    return meta
+
+
+def choose_encoding(accept_encoding):
+    """Выбирает gzip или deflate из Accept-Encoding с учётом q-значений."""
+    weights = {}
+    for item in (accept_encoding or "").split(","):
+        name, _, params = item.strip().partition(";")
+        params = params.strip()
+        try:
+            q = float(params[2:]) if params.startswith("q=") else 1.0
+        except ValueError:
+            q = 0.0
+        weights[name.strip().lower()] = q
+    best, best_q = None, 0.0
+    for encoding in ENCODINGS:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compressed_variant(path, meta, encoding):
+    """Возвращает (путь, размер) сжатой копии файла или None.
+
+    Копия пересобирается, только когда у исходного файла изменились mtime или
+    размер; сжатие идёт потоково, файл целиком в память не читается.
+    """
+    key = (path, encoding)
+    cached = variant_cache.get(key)
+    if cached is None or cached[:2] != meta[:2]:
+        with variant_lock:
+            cached = variant_cache.get(key)
+            if cached is None or cached[:2] != meta[:2]:
+                cached = meta[:2] + build_variant(path, encoding)
+                variant_cache[key] = cached
+    if cached[2] is None:
+        return None
+    return cached[2], cached[3]
+
+
+def build_variant(path, encoding):
+    """Сжимает файл в VARIANT_DIR и возвращает (путь копии, размер копии).
+
+    Вызывается под variant_lock, поэтому папка создаётся один раз.
+    """
+    global VARIANT_DIR
+    if VARIANT_DIR is None:
+        VARIANT_DIR = tempfile.mkdtemp(prefix="task3-variants-")
+        atexit.register(shutil.rmtree, VARIANT_DIR, ignore_errors=True)
+    name = hashlib.sha1(path.encode("utf-8")).hexdigest() + "." + encoding
+    target = os.path.join(VARIANT_DIR, name)
+    tmp = target + ".tmp"
+    with open(path, "rb") as src, open(tmp, "wb") as dst:
+        if encoding == "gzip":
+            with gzip.GzipFile(filename="", fileobj=dst, mode="wb", compresslevel=6, mtime=0) as gz:
+                shutil.copyfileobj(src, gz)
+        else:
+            compressor = zlib.compressobj(6)
+            for chunk in iter(lambda: src.read(64 * 1024), b""):
+                dst.write(compressor.compress(chunk))
+            dst.write(compressor.flush())
+    os.replace(tmp, target)
+    size = os.path.getsize(target)
+    if size >= os.path.getsize(path):
+        # Сжатие не помогло — отдаём исходный файл.
+        os.remove(target)
+        return None, None
+    return target, size
+
+
+def read_request(conn):
+    """Читает строку запроса и заголовки; возвращает (метод, путь, заголовки)."""
+    data = b""
+    while b"\r\n\r\n" not in data:
+        chunk = conn.recv(4096)
+        if not chunk:
+            break
+        data += chunk
+        if len(data) > MAX_REQUEST:
+            return None
+    head = data.split(b"\r\n\r\n", 1)[0].decode("iso-8859-1")
+    lines = head.split("\r\n")
+    words = lines[0].split()
+    if len(words) != 3:
+        return None
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    return words[0], words[1], headers
+
+
+def resolve_path(target):
+    """Переводит путь из URL в файл внутри ROOT_DIR или возвращает None."""
+    try:
+        path = unquote(urlsplit(target).path)
+        full = os.path.realpath(os.path.join(ROOT_DIR, path.lstrip("/")))
+    except ValueError:
+        return None  # %00 в пути или неразборчивый адрес вроде "//["
+    if os.path.commonpath([full, ROOT_DIR]) != ROOT_DIR:
+        return None
+    if os.path.isdir(full):
+        full = os.path.join(full, "index.html")
+    return full if os.path.isfile(full) else None
+
+
+def parse_range(value, size):
+    """Разбирает заголовок Range с одним диапазоном байтов.
+
+    Возвращает (начало, длина) с 0 <= начало <= конец < size, None — если
+    заголовок надо проигнорировать (в том числе синтаксически неверный),
+    или "invalid", если диапазон не пересекается с файлом.
+    """
+    if not value.startswith("bytes=") or "," in value:
+        return None
+    start, dash, end = value[len("bytes="):].strip().partition("-")
+    # Только десятичные цифры: int() принял бы и "-5" из "bytes=--5", и " 5".
+    if not dash or not (start or end) or not all(
+        part.isascii() and part.isdigit() for part in (start, end) if part
+    ):
+        return None
+    if not start:
+        length = min(int(end), size)
+        return (size - length, length) if length else "invalid"
+    start = int(start)
+    if end and int(end) < start:
+        return None  # RFC 9110, 14.1.1: такой диапазон недействителен
+    if start >= size:
+        return "invalid"
+    end = min(int(end), size - 1) if end else size - 1
+    return start, end - start + 1
+
+
+def not_modified(headers, mtime_ns):
+    """Проверяет If-Modified-Since с точностью до секунды."""
+    value = headers.get("if-modified-since")
+    if not value:
+        return False
+    try:
+        since = parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return False
+    return mtime_ns // 1_000_000_000 <= since
+
+
+def send_head(conn, status, headers):
+    """Отправляет строку статуса и заголовки ответа."""
+    lines = [f"HTTP/1.1 {status}"] + [f"{k}: {v}" for k, v in headers]
+    conn.sendall(("\r\n".join(lines) + "\r\n\r\n").encode("iso-8859-1"))
+
+
+def send_error(conn, status):
+    """Отправляет короткий текстовый ответ с кодом ошибки."""
+    body = status.encode("utf-8")
+    send_head(conn, status, [
+        ("Content-Type", "text/plain; charset=UTF-8"),
+        ("Content-Length", len(body)),
+        ("Connection", "close"),
+    ])
+    conn.sendall(body)
+
+
+def handle_client(conn, addr):
+    """Отдаёт запрошенный файл: заголовки отдельно, тело через sendfile."""
+    head_sent = False
+    try:
+        request = read_request(conn)
+        if request is None:
+            send_error(conn, "400 Bad Request")
+            return
+        method, target, headers = request
+        print(f"{addr}: {method} {target}")
+        if method not in ("GET", "HEAD"):
+            send_error(conn, "405 Method Not Allowed")
+            return
+        path = resolve_path(target)
+        if path is None:
+            send_error(conn, "404 Not Found")
+            return
+
+        meta = file_meta(path)
+        mtime_ns, size, content_type, last_modified = meta
+        common = [("Last-Modified", last_modified), ("Accept-Ranges", "bytes")]
+        compressible = content_type.startswith(COMPRESSIBLE_TYPES) and size >= COMPRESS_MIN_SIZE
+        if compressible:
+            common.append(("Vary", "Accept-Encoding"))
+        if not_modified(headers, mtime_ns):
+            send_head(conn, "304 Not Modified", common + [("Connection", "close")])
+            return
+
+        status, offset, count = "200 OK", 0, size
+        encoding = None
+        if compressible and "range" not in headers:
+            encoding = choose_encoding(headers.get("accept-encoding"))
+            variant = compressed_variant(path, meta, encoding) if encoding else None
+            if variant is None:
+                encoding = None
+            else:
+                path, count = variant
+                common.append(("Content-Encoding", encoding))
+
+        byte_range = parse_range(headers.get("range", ""), size)
+        if byte_range == "invalid":
+            send_head(conn, "416 Range Not Satisfiable", [
+                ("Content-Range", f"bytes */{size}"),
+                ("Content-Length", 0),
+                ("Connection", "close"),
+            ])
+            return
+        if byte_range is not None:
+            offset, count = byte_range
+            status = "206 Partial Content"
+            common.append(("Content-Range", f"bytes {offset}-{offset + count - 1}/{size}"))
+
+        # Файл открываем до отправки заголовков: если он исчез или недоступен,
+        # клиент ещё может получить 500, а не оборванный ответ.
+        with open(path, "rb") as file:
+            send_head(conn, status, common + [
+                ("Content-Type", content_type),
+                ("Content-Length", count),
+                ("Connection", "close"),
+            ])
+            head_sent = True
+            if method == "GET" and count:
+                # socket.sendfile использует os.sendfile, если он доступен, и файл
+                # уходит в сокет без копирования в память Python.
+                conn.sendfile(file, offset, count)
+    except (ConnectionResetError, BrokenPipeError):
+        pass
+    except OSError as err:
+        # Гонка между stat и open, нет прав на файл и т. п.
+        print(f"{addr}: {err}")
+        if not head_sent:
+            try:
+                send_error(conn, "500 Internal Server Error")
+            except OSError:
+                pass
+    finally:
+        conn.close()
+
+
+def main():
+    """Запускает HTTP-сервер и создаёт поток на каждого клиента.
+
+    python server.py [папка] — раздаёт файлы из папки (по умолчанию static).
+    """
+    global ROOT_DIR
+    if len(sys.argv) > 1:
+        ROOT_DIR = os.path.realpath(sys.argv[1])
+    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server_socket.bind((HOST, PORT))
+    server_socket.listen(128)
+    print(f"Раздаём {ROOT_DIR} на http://{HOST}:{PORT}/")
+
+    while True:
+        # Принимаем клиента и обрабатываем его в отдельном потоке.
+        client_connection, client_address = server_socket.accept()
+        threading.Thread(
+            target=handle_client, args=(client_connection, client_address), daemon=True
+        ).start()
+
+
+if __name__ == "__main__":
+    main()
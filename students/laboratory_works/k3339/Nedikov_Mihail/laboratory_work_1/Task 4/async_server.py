@@ -0,0 +1,309 @@
+import asyncio
+import wheel
+from history import History, replay
+from utils import FORMATS, BinaryCodec, FrameReader, choose_format, encode_json
+
+QUEUE_SIZE = 256  # кадров в очереди одного клиента
+WRITE_BUFFER_LIMIT = 64 * 1024  # байт в буфере сокета до ожидания drain
+POLICIES = ("drop", "disconnect")
+DEFAULT_ROOM = "general"
+
+
+class Client:
+    """Подключённый клиент с ограниченной очередью исходящих кадров."""
+
+    def __init__(self, writer, nick, queue_size, fmt="json", room=DEFAULT_ROOM):
+        self.writer = writer
+        self.nick = nick
+        self.format = fmt
+        self.room = room
+        self.queue = asyncio.Queue(queue_size)
+        self.dropped = 0
+        self.known = set()  # id ников, которые бинарный клиент уже получил
+
+    async def write_loop(self):
+        """Отправляет кадры из очереди; всё накопленное уходит одним writelines.
+
+        None в очереди — запрос на закрытие от close(): кадры до него
+        дописываются в сокет, и соединение закрывается.
+        """
+        while True:
+            frames = [await self.queue.get()]
+            while not self.queue.empty():
+                frames.append(self.queue.get_nowait())
+            if None in frames:
+                self.writer.writelines(frames[:frames.index(None)])
+                await self.writer.drain()
+                self.writer.close()
+                return
+            self.writer.writelines(frames)
+            await self.writer.drain()
+
+    def close(self):
+        """Просит write_loop закрыть соединение после уже поставленных кадров."""
+        try:
+            self.queue.put_nowait(None)
+        except asyncio.QueueFull:
+            self.writer.transport.abort()  # дописать очередь всё равно не выйдет
+
+
+class AsyncChatServer:
+    """Чат на asyncio с тем же протоколом, что и потоковый server.py.
+
+    Рассылка не ждёт получателей: кадр кладётся в очередь каждого клиента,
+    а отдельная задача клиента пишет его в сокет. Если очередь медленного
+    клиента заполнена, по политике "drop" кадр для него отбрасывается, а по
+    политике "disconnect" клиент отключается. Рассылка идёт только по
+    участникам комнаты отправителя.
+
+    Дедлайны чтения ведёт колесо таймеров: клиенту, который молчит
+    idle_timeout секунд, отправляется ping, а не ответившего за
+    ping_timeout задача reap() отключает.
+    """
+
+    def __init__(self, policy="drop", queue_size=QUEUE_SIZE, history_dir=None,
+                 idle_timeout=wheel.IDLE_TIMEOUT, ping_timeout=wheel.PING_TIMEOUT):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy {policy!r}, expected one of {POLICIES}")
+        self.policy = policy
+        self.queue_size = queue_size
+        self.clients = {}  # writer -> Client; доступ только из цикла событий
+        self.rooms = {}  # имя комнаты -> {writer: Client}
+        self.history = History(directory=history_dir)
+        self.codec = BinaryCodec()
+        self.encoders = {"json": encode_json, "binary": self.codec.encode}
+        self.idle_timeout = idle_timeout
+        self.ping_timeout = ping_timeout
+        self.timers = wheel.TimerWheel()
+        self.pinged = set()  # writer клиентов, которым отправлен ping без ответа
+
+    def broadcast(self, room, sender, obj, include_sender=False, formats=FORMATS):
+        """Рассылает сообщение комнате; в кластере cluster.py переопределяет её."""
+        self.deliver(room, sender, obj, include_sender, formats)
+
+    def deliver(self, room, sender, obj, include_sender=False, formats=FORMATS):
+        """Сериализует сообщение один раз на формат и ставит его в очереди комнаты.
+
+        Во все очереди попадает один и тот же объект bytes, так что память
+        под сообщение не зависит от числа получателей. Сообщения чата
+        перед рассылкой попадают в историю комнаты.
+        """
+        author = None
+        if obj["type"] == "chat":
+            self.history.get(room).append(obj)
+            if room not in self.rooms:
+                # Сообщение с другого воркера кластера в комнату без наших
+                # участников: историю дописываем, но файл не держим открытым.
+                self.history.release(room)
+            author = self.codec.intern(obj["user"])
+        elif obj["type"] == "user":
+            author = obj["id"]
+        frames = {}
+        for client in list(self.rooms.get(room, {}).values()):
+            if client is sender and not include_sender or client.format not in formats:
+                continue
+            frame = frames.get(client.format)
+            if frame is None:
+                frame = frames[client.format] = self.encoders[client.format](obj)
+            # Автор с другого воркера кластера мог ещё не попасть в таблицу
+            # ников клиента: отправляем его id перед сообщением. В known id
+            # попадает, только когда его кадр уже в очереди: отброшенный по
+            # политике drop кадр уйдёт заново со следующим сообщением автора.
+            unknown = (
+                client.format == "binary" and author is not None and author not in client.known
+            )
+            try:
+                if unknown and obj["type"] == "chat":
+                    client.queue.put_nowait(self.codec.user_frames([obj["user"]])[0])
+                    client.known.add(author)
+                client.queue.put_nowait(frame)
+                if unknown:
+                    client.known.add(author)
+            except asyncio.QueueFull:
+                if self.policy == "disconnect":
+                    self.disconnect(client)
+                else:
+                    client.dropped += 1
+
+    def disconnect(self, client):
+        """Отключает клиента, не дожидаясь отправки его очереди."""
+        if self.clients.pop(client.writer, None) is not None:
+            self.leave_room(client)
+        client.writer.transport.abort()
+
+    def enter_room(self, client, name, request=None):
+        """Переводит клиента в комнату и сообщает о нём её участникам.
+
+        Ники участников и история по параметрам из request склеиваются в
+        один элемент очереди клиента: их может быть больше, чем мест в ней,
+        а write_loop отправит их с тем же ожиданием drain, что и остальное.
+        Если очередь полна, действует политика сервера.
+        """
+        members = self.rooms.get(name, {})
+        entries = replay(self.history.get(name), request or {})
+        frames = []
+        nicks = []
+        if client.format == "binary":
+            nicks = [o.nick for o in members.values()] + [msg["user"] for msg in entries]
+            frames += self.codec.user_frames(nicks)
+        frames += [self.encoders[client.format](msg) for msg in entries]
+        if frames:
+            try:
+                client.queue.put_nowait(b"".join(frames))
+            except asyncio.QueueFull:
+                if self.policy == "disconnect":
+                    self.disconnect(client)
+                    return
+                client.dropped += 1
+            else:
+                client.known.update(self.codec.intern(nick) for nick in nicks)
+        client.room = name
+        self.rooms.setdefault(name, members)[client.writer] = client
+        self.broadcast(
+            name, client, {"type": "user", "id": self.codec.ids[client.nick], "user": client.nick},
+            include_sender=True, formats=("binary",),
+        )
+
+    def leave_room(self, client):
+        """Убирает клиента из его комнаты; пустая комната удаляется."""
+        members = self.rooms.get(client.room)
+        if members is not None:
+            members.pop(client.writer, None)
+            if not members:
+                del self.rooms[client.room]
+                self.history.release(client.room)
+
+    def touch(self, writer):
+        """Отмечает входящий кадр: дедлайн чтения снова через idle_timeout."""
+        self.pinged.discard(writer)
+        self.timers.schedule(writer, self.idle_timeout)
+
+    async def reap(self):
+        """Раз в тик пингует молчащих клиентов и отключает не ответивших."""
+        while True:
+            await asyncio.sleep(self.timers.tick)
+            for writer in self.timers.advance():
+                client = self.clients.get(writer)
+                if client is None or writer in self.pinged:
+                    writer.transport.abort()  # handle_client сам уберёт клиента
+                    continue
+                try:
+                    client.queue.put_nowait(self.encoders[client.format]({"type": "ping"}))
+                except asyncio.QueueFull:
+                    writer.transport.abort()
+                    continue
+                self.pinged.add(writer)
+                self.timers.schedule(writer, self.ping_timeout)
+
+    async def handle_client(self, reader, writer):
+        """Регистрирует клиента, читает его сообщения и отправляет их в чат."""
+        addr = writer.get_extra_info("peername")
+        writer.transport.set_write_buffer_limits(high=WRITE_BUFFER_LIMIT)
+        client = None
+        write_task = None
+        graceful = False  # клиент ушёл сам: его очередь дописывается перед закрытием
+        frames = FrameReader()
+        self.timers.schedule(writer, wheel.HANDSHAKE_TIMEOUT)
+        try:
+            hello = await frames.read_message(reader)
+            if not hello or hello.get("type") != "join":
+                return
+            self.touch(writer)
+            # В историю и словарь кодека попадают только строки: число или
+            # список там сломал бы двоичное кодирование для всех в комнате.
+            nick = str(hello.get("user", f"User{addr[1]}"))
+            fmt = choose_format(hello.get("formats"))
+            room = str(hello.get("room") or DEFAULT_ROOM)
+            self.codec.intern(nick)
+            client = Client(writer, nick, self.queue_size, fmt)
+            # Ответ идёт прямо в буфер сокета, до запуска write_loop и рассылок.
+            if "formats" in hello:
+                writer.write(encode_json({"type": "welcome", "format": fmt, "room": room}))
+            if fmt == "binary":
+                frames.decode = self.codec.decode
+            write_task = asyncio.create_task(client.write_loop())
+            self.clients[writer] = client
+            self.enter_room(client, room, hello)
+            if writer not in self.clients:
+                return  # отключён политикой disconnect при входе в комнату
+            self.broadcast(
+                room, client, {"type": "system", "text": f"*** {nick} зашел в чат"}, include_sender=True
+            )
+            while writer in self.clients:
+                msg = await frames.read_message(reader)
+                if msg is None or msg.get("type") == "leave":
+                    graceful = True
+                    break
+                self.touch(writer)
+                if msg.get("type") == "ping":
+                    try:
+                        client.queue.put_nowait(self.encoders[fmt]({"type": "pong"}))
+                    except asyncio.QueueFull:
+                        pass  # очередь полна — клиент и так узнает, что сервер жив
+                    continue
+                if msg.get("type") == "pong":
+                    continue
+                if msg.get("type") in ("join_room", "leave_room"):
+                    room = str(msg.get("room") or DEFAULT_ROOM)
+                    if msg["type"] == "leave_room":
+                        room = DEFAULT_ROOM
+                    if room != client.room:
+                        self.leave_room(client)
+                        self.broadcast(
+                            client.room, client,
+                            {"type": "system", "text": f"*** {nick} перешел в комнату {room}"},
+                        )
+                        self.enter_room(client, room, msg)
+                        if writer not in self.clients:
+                            break
+                        self.broadcast(
+                            room, client,
+                            {"type": "system", "text": f"*** {nick} зашел в комнату {room}"},
+                            include_sender=True,
+                        )
+                    continue
+                self.broadcast(
+                    client.room, client, {"type": "chat", "user": nick, "text": str(msg.get("text", ""))}
+                )
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            if client is not None and self.clients.pop(writer, None) is not None:
+                self.leave_room(client)
+                self.broadcast(
+                    client.room, client, {"type": "system", "text": f"*** {client.nick} вышел из чата"}
+                )
+            self.timers.cancel(writer)
+            self.pinged.discard(writer)
+            if write_task is not None and graceful:
+                client.close()
+                try:
+                    # Медленному клиенту дописываем не дольше ping_timeout.
+                    await asyncio.wait_for(write_task, self.ping_timeout)
+                except (ConnectionError, asyncio.TimeoutError):
+                    pass
+            elif write_task is not None:
+                write_task.cancel()
+            writer.close()
+
+    async def serve(self, host, port, reuse_port=False):
+        """Принимает подключения, пока процесс не остановят."""
+        server = await asyncio.start_server(
+            self.handle_client, host, port, backlog=4096, reuse_port=reuse_port
+        )
+        print(f"Сервер (asyncio, политика {self.policy}) слушает {host}:{port}")
+        reaper = asyncio.create_task(self.reap())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            reaper.cancel()
+
+
+def run(host, port, policy="drop", history_dir=None):
+    """Запускает асинхронный сервер в новом цикле событий."""
+    server = AsyncChatServer(policy, history_dir=history_dir)
+    try:
+        asyncio.run(server.serve(host, port))
+    finally:
+        server.history.close()
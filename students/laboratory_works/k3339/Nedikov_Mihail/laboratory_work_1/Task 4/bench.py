@@ -0,0 +1,119 @@
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from server import HOST, PORT
+from utils import encode_json, recv_json_async, send_frames
+
+# Бенчмарк рассылки: сколько сообщений в секунду доходит до всех участников
+# в зависимости от размера комнаты. Запуск:
+#   python bench.py [threads|asyncio] [число_сообщений] [размер1 размер2 ...]
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BURST = 50  # сообщений в одном вызове sendmsg у отправителя
+RECV_TIMEOUT = 2
+
+
+def start_server(mode):
+    """Запускает server.py в отдельном процессе и ждёт, пока он начнёт слушать."""
+    args = [sys.executable, os.path.join(BASE_DIR, "server.py")]
+    if mode == "asyncio":
+        args += ["asyncio", "drop"]
+    proc = subprocess.Popen(
+        args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=BASE_DIR
+    )
+    for _ in range(100):
+        try:
+            socket.create_connection((HOST, PORT), timeout=0.1).close()
+            return proc
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError("server did not start")
+
+
+async def receiver(reader, expected):
+    """Читает кадры, пока не получит expected сообщений чата.
+
+    Асинхронный сервер с политикой drop может отбросить часть кадров, поэтому
+    после паузы в RECV_TIMEOUT секунд получатель сдаётся.
+    """
+    got = 0
+    while got < expected:
+        try:
+            msg = await asyncio.wait_for(recv_json_async(reader), RECV_TIMEOUT)
+        except asyncio.TimeoutError:
+            break
+        if msg is None:
+            break
+        if msg["type"] == "chat":
+            got += 1
+    return got
+
+
+def encode_cost(room, repeat=200):
+    """Время сериализации одного сообщения на всю комнату: раньше и сейчас."""
+    obj = {"type": "chat", "user": "bench", "text": "x" * 100}
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for _ in range(room):
+            len(json.dumps(obj).encode("utf-8")).to_bytes(4, "big")
+    per_target = (time.perf_counter() - start) / repeat * 1e6
+    start = time.perf_counter()
+    for _ in range(repeat):
+        encode_json(obj)
+    once = (time.perf_counter() - start) / repeat * 1e6
+    return per_target, once
+
+
+async def bench_room(room, messages):
+    readers = []
+    for i in range(room):
+        reader, writer = await asyncio.open_connection(HOST, PORT)
+        writer.write(encode_json({"type": "join", "user": f"r{i}"}))
+        readers.append((reader, writer))
+    await asyncio.sleep(0.3 + room / 1000)
+
+    sender = socket.create_connection((HOST, PORT))
+    sender.sendall(encode_json({"type": "join", "user": "sender"}))
+    frames = [encode_json({"type": "chat", "text": f"message {i}"}) for i in range(messages)]
+
+    start = time.perf_counter()
+    tasks = [asyncio.create_task(receiver(r, messages)) for r, _ in readers]
+    loop = asyncio.get_running_loop()
+    for i in range(0, messages, BURST):
+        await loop.run_in_executor(None, send_frames, sender, frames[i:i + BURST])
+    delivered = sum(await asyncio.gather(*tasks))
+    elapsed = time.perf_counter() - start
+
+    sender.close()
+    for _, writer in readers:
+        writer.close()
+    return messages / elapsed, delivered / elapsed, delivered
+
+
+def main():
+    mode = sys.argv[1] if len(sys.argv) > 1 else "threads"
+    messages = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    rooms = [int(arg) for arg in sys.argv[3:]] or [10, 100, 500]
+    print(f"Режим {mode}, {messages} сообщений на комнату")
+    for room in rooms:
+        proc = start_server(mode)
+        try:
+            rate, fanout, delivered = asyncio.run(bench_room(room, messages))
+        finally:
+            proc.kill()
+            proc.wait()
+        per_target, once = encode_cost(room)
+        print(
+            f"  комната {room:>5}: {rate:8.0f} сообщ/с, {fanout:10.0f} доставок/с "
+            f"({delivered}/{room * messages}); сериализация на комнату: "
+            f"{per_target:7.1f} мкс по-старому, {once:5.1f} мкс один раз"
+        )
+
+
+if __name__ == "__main__":
+    main()
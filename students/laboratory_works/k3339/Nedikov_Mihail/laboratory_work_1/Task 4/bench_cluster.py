@@ -0,0 +1,54 @@
+import asyncio
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+from bench import BASE_DIR
+from bench_rooms import bench_rooms
+from server import HOST, PORT
+
+# Бенчмарк кластерного режима: та же нагрузка, что в bench_rooms.py, на
+# кластере из разного числа воркеров. Клиенты одной комнаты попадают на
+# разные воркеры, так что тест заодно проверяет пересылку через брокер.
+# Запуск:
+#   python bench_cluster.py [сообщений_на_комнату] [КОМНАТЫxУЧАСТНИКИ] [воркеры ...]
+
+
+def start_cluster(workers):
+    """Запускает server.py cluster в отдельной группе процессов."""
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(BASE_DIR, "server.py"), "cluster", str(workers)],
+        stdout=subprocess.DEVNULL, cwd=BASE_DIR, start_new_session=True,
+    )
+    time.sleep(0.5 + workers * 0.2)  # воркеры подключаются к шине после старта
+    for _ in range(100):
+        try:
+            socket.create_connection((HOST, PORT), timeout=0.1).close()
+            return proc
+        except OSError:
+            time.sleep(0.05)
+    os.killpg(proc.pid, signal.SIGKILL)
+    raise RuntimeError("cluster did not start")
+
+
+def main():
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rooms, members = (int(x) for x in (sys.argv[2] if len(sys.argv) > 2 else "20x10").split("x"))
+    counts = [int(arg) for arg in sys.argv[3:]] or sorted({1, 2, os.cpu_count() or 1})
+    print(f"{rooms} комнат x {members}, {messages} сообщений на комнату, ядер: {os.cpu_count()}")
+    for workers in counts:
+        proc = start_cluster(workers)
+        try:
+            rate, own, foreign = asyncio.run(bench_rooms(rooms, members, messages))
+        finally:
+            os.killpg(proc.pid, signal.SIGKILL)
+            proc.wait()
+        expected = rooms * (members - 1) * messages
+        print(f"  воркеров {workers:>2}: {rate:9.0f} доставок/с ({own}/{expected}, чужих {foreign})")
+
+
+if __name__ == "__main__":
+    main()
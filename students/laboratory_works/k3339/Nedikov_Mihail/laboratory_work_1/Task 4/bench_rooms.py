@@ -0,0 +1,95 @@
+import asyncio
+import sys
+import time
+
+from bench import start_server
+from server import HOST, PORT
+from utils import FrameReader, encode_json
+
+# Нагрузочный тест комнат: во всех комнатах одновременно пишет по одному
+# участнику, остальные участники считают доставленные сообщения и проверяют,
+# что чужие комнаты к ним не просачиваются. Запуск:
+#   python bench_rooms.py [threads|asyncio] [сообщений_на_комнату] [КОМНАТЫxУЧАСТНИКИ ...]
+RECV_TIMEOUT = 2
+
+
+async def connect(nick, room):
+    reader, writer = await asyncio.open_connection(HOST, PORT)
+    writer.write(encode_json({"type": "join", "user": nick, "room": room}))
+    return reader, writer
+
+
+async def receiver(reader, room, expected):
+    """Возвращает (своих сообщений, чужих сообщений)."""
+    frames = FrameReader()
+    own = foreign = 0
+    while own < expected:
+        try:
+            msg = await asyncio.wait_for(frames.read_message(reader), RECV_TIMEOUT)
+        except asyncio.TimeoutError:
+            break
+        if msg is None:
+            break
+        if msg["type"] == "chat":
+            if msg["text"].startswith(room + ":"):
+                own += 1
+            else:
+                foreign += 1
+    return own, foreign
+
+
+async def sender(writer, room, messages):
+    for i in range(messages):
+        writer.write(encode_json({"type": "chat", "text": f"{room}: {i}"}))
+        if i % 50 == 49:
+            await writer.drain()
+    await writer.drain()
+
+
+async def bench_rooms(rooms, members, messages):
+    conns = {}
+    for r in range(rooms):
+        room = f"room{r}"
+        conns[room] = [await connect(f"{room}-u{m}", room) for m in range(members)]
+    await asyncio.sleep(0.3 + rooms * members / 1000)
+
+    start = time.perf_counter()
+    receivers = [
+        asyncio.create_task(receiver(reader, room, messages))
+        for room, members_conns in conns.items()
+        for reader, _ in members_conns[1:]
+    ]
+    await asyncio.gather(*(sender(c[0][1], room, messages) for room, c in conns.items()))
+    results = await asyncio.gather(*receivers)
+    elapsed = time.perf_counter() - start
+
+    for members_conns in conns.values():
+        for _, writer in members_conns:
+            writer.close()
+    own = sum(r[0] for r in results)
+    foreign = sum(r[1] for r in results)
+    return own / elapsed, own, foreign
+
+
+def main():
+    mode = sys.argv[1] if len(sys.argv) > 1 else "threads"
+    messages = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    configs = sys.argv[3:] or ["1x200", "20x10", "100x10"]
+    print(f"Режим {mode}, {messages} сообщений от одного участника каждой комнаты")
+    for config in configs:
+        rooms, members = (int(x) for x in config.split("x"))
+        proc = start_server(mode)
+        try:
+            rate, own, foreign = asyncio.run(bench_rooms(rooms, members, messages))
+        finally:
+            proc.kill()
+            proc.wait()
+        expected = rooms * (members - 1) * messages
+        print(
+            f"  {rooms:>4} комнат x {members:<4}: {rate:9.0f} доставок/с "
+            f"({own}/{expected}, чужих {foreign})"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import sys
+import time
+
+from utils import BinaryCodec, HEADER_SIZE, decode_json, encode_json
+
+# Бенчмарк форматов кадра: байты на сообщение и стоимость кодирования и
+# декодирования для JSON и бинарного формата. Запуск:
+#   python bench_wire.py [число_повторов]
+SAMPLES = {
+    "короткое": {"type": "chat", "user": "Mihail", "text": "привет"},
+    "обычное": {"type": "chat", "user": "student_k3339", "text": "Во сколько сегодня защита лабораторной?"},
+    "длинное": {"type": "chat", "user": "student_k3339", "text": "lorem ipsum " * 40},
+    "системное": {"type": "system", "text": "*** student_k3339 зашел в чат"},
+}
+
+
+def per_call(fn, arg, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(arg)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    server = BinaryCodec()
+    client = BinaryCodec()
+    print(f"{'сообщение':<10}{'формат':<8}{'байт':>6}{'кодирование':>14}{'декодирование':>16}")
+    for label, msg in SAMPLES.items():
+        if "user" in msg:
+            # Таблица ников у клиента заполняется один раз при входе в чат.
+            announce = {"type": "user", "id": server.intern(msg["user"]), "user": msg["user"]}
+            client.decode(server.encode(announce)[HEADER_SIZE:])
+        for fmt, encode, decode in (
+            ("json", encode_json, decode_json),
+            ("binary", server.encode, client.decode),
+        ):
+            frame = encode(msg)
+            payload = memoryview(frame)[HEADER_SIZE:]
+            assert decode(payload) == msg
+            encode_cost = per_call(encode, msg, repeat)
+            decode_cost = per_call(decode, payload, repeat)
+            print(
+                f"{label:<10}{fmt:<8}{len(frame):>6}"
+                f"{encode_cost:>11.2f} мкс{decode_cost:>13.2f} мкс"
+            )
+
+
+if __name__ == "__main__":
+    main()
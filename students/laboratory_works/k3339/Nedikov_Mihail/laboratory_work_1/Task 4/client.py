@@ -1,20 +1,22 @@
 import socket
 import threading
-from utils import send_json, recv_json
+from utils import FORMATS, BinaryCodec, FrameReader, encode_json
 
 HOST, PORT = "127.0.0.1", 9090
 
 running = True  # Флаг, который завершает поток чтения при выходе.
 
 
-def listen(sock):
+def listen(sock, frames, send):
     """Получает сообщения от сервера и выводит их пользователю."""
     global running
     while running:
-        msg = recv_json(sock)
+        msg = frames.recv_message(sock)
         if msg is None:
             break
-        if msg["type"] == "system":
+        if msg["type"] == "ping":
+            send({"type": "pong"})  # иначе сервер сочтёт соединение мёртвым
+        elif msg["type"] == "system":
             print(msg["text"])
         elif msg["type"] == "chat":
             print(f"{msg['user']}: {msg['text']}")
@@ -27,11 +29,20 @@ def main():
     cli = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     cli.connect((HOST, PORT))
 
-    # Сообщаем серверу, что мы присоединились к чату.
-    send_json(cli, {"type": "join", "user": nick})
+    # Сообщаем серверу, что мы присоединились к чату, и предлагаем форматы.
+    cli.sendall(encode_json({"type": "join", "user": nick, "formats": list(FORMATS)}))
+    frames = FrameReader()
+    welcome = frames.recv_message(cli)
+    encode = encode_json
+    if welcome and welcome.get("format") == "binary":
+        codec = BinaryCodec()
+        frames.decode, encode = codec.decode, codec.encode
+
+    def send(obj):
+        cli.sendall(encode(obj))
 
     # Запускаем поток, который слушает сообщения от сервера.
-    listener = threading.Thread(target=listen, args=(cli,))
+    listener = threading.Thread(target=listen, args=(cli, frames, send))
     listener.start()
 
     while True:
@@ -39,12 +50,18 @@ def main():
         if text.strip().lower() == "/quit":
             # Предупреждаем сервер о выходе, если есть возможность.
             try:
-                send_json(cli, {"type": "leave"})
+                send({"type": "leave"})
             except Exception:
                 pass
             running = False
             break
-        send_json(cli, {"type": "chat", "text": text})
+        if text.startswith("/join "):
+            # Переходим в другую комнату; /leave возвращает в общую.
+            send({"type": "join_room", "room": text[len("/join "):].strip()})
+        elif text.strip() == "/leave":
+            send({"type": "leave_room"})
+        else:
+            send({"type": "chat", "text": text})
 
     cli.close()
     listener.join()  # Ждём, пока поток чтения корректно завершится.
@@ -0,0 +1,178 @@
+import asyncio
+import multiprocessing
+import os
+import tempfile
+
+from async_server import AsyncChatServer
+from utils import FORMATS, FrameReader, encode_json
+
+# Кластерный режим: N процессов-воркеров слушают один порт через
+# SO_REUSEPORT, а события комнат ходят между ними через процесс-брокер по
+# Unix-сокету. Кадры шины — те же "длина + JSON", что и у клиентов.
+BUS_PATH = os.path.join(tempfile.gettempdir(), f"task4-chat-bus-{os.getpid()}.sock")
+
+
+class Broker:
+    """Пересылает события комнат между воркерами.
+
+    Сообщения чата проходят через брокер и для воркера-отправителя: брокер
+    назначает им номер seq внутри комнаты, так что все воркеры видят один
+    порядок и одинаковую историю. Остальные события отправитель доставляет
+    своим клиентам сам, и брокер пересылает их только другим воркерам.
+    """
+
+    def __init__(self):
+        self.workers = {}  # writer -> номер воркера
+        self.seqs = {}  # комната -> последний выданный seq
+
+    async def handle_worker(self, reader, writer):
+        """Читает события одного воркера и рассылает их остальным."""
+        frames = FrameReader()
+        hello = await frames.read_message(reader)
+        self.workers[writer] = hello["worker"]
+        try:
+            while True:
+                event = await frames.read_message(reader)
+                if event is None:
+                    break
+                self.route(writer, event)
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            self.workers.pop(writer, None)
+            writer.close()
+
+    def route(self, origin, event):
+        """Нумерует сообщения чата и пересылает событие воркерам."""
+        msg = event["msg"]
+        to_origin = False
+        if msg["type"] == "chat":
+            # После перезапуска брокера продолжаем нумерацию с истории воркера.
+            room = event["room"]
+            seq = max(self.seqs.get(room, 0), event.get("last_seq", 0)) + 1
+            msg["seq"] = self.seqs[room] = seq
+            to_origin = True
+        frame = encode_json(event)
+        for writer in self.workers:
+            if writer is not origin or to_origin:
+                writer.write(frame)
+
+    async def serve(self, path):
+        """Слушает Unix-сокет шины; старый файл сокета удаляется."""
+        if os.path.exists(path):
+            os.remove(path)
+        server = await asyncio.start_unix_server(self.handle_worker, path)
+        async with server:
+            await server.serve_forever()
+
+
+class ClusterChatServer(AsyncChatServer):
+    """Воркер кластера: обычный асинхронный сервер плюс подписка на шину.
+
+    id ников у каждого воркера свои; бинарный клиент получает id автора с
+    другого воркера перед его первым сообщением (см. AsyncChatServer.deliver).
+    """
+
+    def __init__(self, worker, bus_path, policy="drop", history_dir=None):
+        super().__init__(policy, history_dir=history_dir)
+        self.worker = worker
+        self.bus_path = bus_path
+        self.bus = None
+        self.by_token = {}  # id(client) -> Client, чтобы узнать своего отправителя
+
+    def publish(self, event):
+        """Отправляет событие брокеру, не дожидаясь записи."""
+        event["origin"] = self.worker
+        self.bus.write(encode_json(event))
+
+    def broadcast(self, room, sender, obj, include_sender=False, formats=FORMATS):
+        """Доставляет событие своим клиентам и публикует его на шину."""
+        event = {
+            "room": room, "msg": obj, "include_sender": include_sender,
+            "formats": list(formats), "sender": id(sender) if sender else None,
+        }
+        if obj["type"] == "chat":
+            # Доставим, когда брокер вернёт сообщение с номером.
+            event["last_seq"] = self.history.get(room).last_seq
+        else:
+            self.deliver(room, sender, obj, include_sender, formats)
+        self.publish(event)
+
+    def enter_room(self, client, name, request=None):
+        self.by_token[id(client)] = client
+        super().enter_room(client, name, request)
+
+    def leave_room(self, client):
+        super().leave_room(client)
+        if client.writer not in self.clients:
+            self.by_token.pop(id(client), None)
+
+    def on_event(self, event):
+        """Применяет событие с шины к локальным клиентам."""
+        room = event["room"]
+        msg = event["msg"]
+        if msg["type"] == "user":
+            msg["id"] = self.codec.intern(msg["user"])  # id у каждого воркера свои
+        sender = None
+        if event["origin"] == self.worker:
+            sender = self.by_token.get(event["sender"])
+        self.deliver(room, sender, msg, event["include_sender"], event["formats"])
+
+    async def read_bus(self, reader):
+        """Читает шину; без брокера воркер завершается вместе с ним."""
+        frames = FrameReader()
+        while True:
+            event = await frames.read_message(reader)
+            if event is None:
+                raise ConnectionError("Chat bus closed")
+            self.on_event(event)
+
+    async def serve(self, host, port, reuse_port=True):
+        """Подключается к шине и слушает общий порт через SO_REUSEPORT."""
+        reader, self.bus = await asyncio.open_unix_connection(self.bus_path)
+        self.bus.write(encode_json({"worker": self.worker}))
+        bus_task = asyncio.create_task(self.read_bus(reader))
+        serve_task = asyncio.create_task(super().serve(host, port, reuse_port))
+        await asyncio.gather(bus_task, serve_task)
+
+
+def run_worker(worker, host, port, policy, history_dir, bus_path):
+    """Точка входа дочернего процесса-воркера."""
+    if history_dir is not None:
+        # У каждого воркера своя копия истории: номера seq в них совпадают.
+        history_dir = os.path.join(history_dir, f"worker{worker}")
+    server = ClusterChatServer(worker, bus_path, policy, history_dir)
+    try:
+        asyncio.run(server.serve(host, port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.history.close()
+
+
+def run(host, port, workers, policy="drop", history_dir=None):
+    """Запускает брокер в этом процессе и workers воркеров в дочерних."""
+    broker = Broker()
+
+    async def main():
+        bus = asyncio.create_task(broker.serve(BUS_PATH))
+        while not os.path.exists(BUS_PATH):
+            await asyncio.sleep(0.01)
+        procs = [
+            multiprocessing.Process(
+                target=run_worker, args=(i, host, port, policy, history_dir, BUS_PATH), daemon=True
+            )
+            for i in range(workers)
+        ]
+        for proc in procs:
+            proc.start()
+        print(f"Кластер: {workers} воркеров на {host}:{port}, шина {BUS_PATH}")
+        await bus
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if os.path.exists(BUS_PATH):
+            os.remove(BUS_PATH)
@@ -0,0 +1,205 @@
+import json
+import os
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from urllib.parse import quote
+
+HISTORY_SIZE = 100  # сообщений в памяти на комнату
+REPLAY_DEFAULT = 20  # столько последних сообщений получает вошедший клиент
+COMPACT_FACTOR = 4  # файл комнаты переписывается, когда в нём столько ёмкостей
+IDLE_ROOMS = 1024  # столько историй опустевших комнат держится в памяти
+
+
+class RoomHistory:
+    """Последние сообщения комнаты в кольцевом буфере фиксированного размера.
+
+    Каждое сообщение получает номер seq, растущий внутри комнаты; клиент
+    может передать последний увиденный номер как курсор. Номера в буфере
+    упорядочены, поэтому поиск по курсору — бинарный, O(log n).
+
+    Если задан path, сообщения дописываются в файл по одному JSON в строке,
+    и после перезапуска буфер восстанавливается из его хвоста. Когда файл
+    становится в COMPACT_FACTOR раз больше буфера, он переписывается
+    содержимым буфера через временный файл.
+    """
+
+    def __init__(self, capacity=HISTORY_SIZE, path=None):
+        self.capacity = capacity
+        self._items = [None] * capacity
+        self._start = 0  # индекс самого старого сообщения в _items
+        self._count = 0
+        self.last_seq = 0
+        self.path = path
+        self._file = None
+        self._lines = 0  # строк в файле
+        if path is not None:
+            self._load()
+            self._file = open(path, "a", encoding="utf-8")
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        """Сообщение по логическому индексу: 0 — самое старое."""
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        return self._items[(self._start + index) % self.capacity]
+
+    def append(self, msg):
+        """Сохраняет сообщение, вытесняя самое старое.
+
+        Номер seq выдаётся здесь, если его не назначил брокер кластера.
+        """
+        self.last_seq = msg.setdefault("seq", self.last_seq + 1)
+        end = (self._start + self._count) % self.capacity
+        self._items[end] = msg
+        if self._count < self.capacity:
+            self._count += 1
+        else:
+            self._start = (self._start + 1) % self.capacity
+        if self._file is not None:
+            self._file.write(json.dumps(msg) + "\n")
+            self._file.flush()
+            self._lines += 1
+            if self._lines >= self.capacity * COMPACT_FACTOR:
+                self._compact()
+        return self.last_seq
+
+    def last(self, n):
+        """Последние n сообщений в порядке отправки."""
+        n = max(0, min(n, self._count))
+        return [self[i] for i in range(self._count - n, self._count)]
+
+    def since(self, cursor):
+        """Сообщения с seq больше cursor из тех, что ещё лежат в буфере."""
+        first = bisect_right(_SeqView(self), cursor)
+        return [self[i] for i in range(first, self._count)]
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def reopen(self):
+        """Снова открывает файл после close(), не перечитывая его."""
+        if self.path is not None and self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+
+    def _load(self):
+        """Восстанавливает буфер из хвоста файла; оборванную строку отрезает."""
+        if not os.path.exists(self.path):
+            return
+        valid = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # запись оборвалась при падении процесса
+                valid += len(line)
+                try:
+                    msg = json.loads(line)
+                except ValueError:
+                    continue
+                if not isinstance(msg, dict) or not all(
+                    isinstance(msg.get(key, ""), str) for key in ("user", "text")
+                ):
+                    continue  # записано до проверки типов, двоичный кодек его не закодирует
+                self._lines += 1
+                self.append(msg)
+        if valid < os.path.getsize(self.path):
+            os.truncate(self.path, valid)
+        if self._lines > self.capacity:
+            self._compact()
+
+    def _compact(self):
+        """Оставляет в файле только сообщения из буфера."""
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for i in range(self._count):
+                f.write(json.dumps(self[i]) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        if self._file is not None:
+            self._file.close()
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._lines = self._count
+
+
+class _SeqView:
+    """Последовательность номеров сообщений буфера для bisect."""
+
+    def __init__(self, history):
+        self.history = history
+
+    def __len__(self):
+        return len(self.history)
+
+    def __getitem__(self, index):
+        return self.history[index]["seq"]
+
+
+class History:
+    """Истории всех комнат; файлы комнат лежат в directory, если он задан.
+
+    Когда комната пустеет, сервер вызывает release(): файл истории
+    закрывается, а сама история уходит в очередь последних IDLE_ROOMS
+    опустевших комнат. Так открыты файлы только занятых комнат, а память
+    ограничена их числом плюс IDLE_ROOMS. История, вытесненная из очереди,
+    при следующем входе в комнату читается из файла заново (без файла она
+    теряется).
+    """
+
+    def __init__(self, capacity=HISTORY_SIZE, directory=None, idle_rooms=IDLE_ROOMS):
+        self.capacity = capacity
+        self.directory = directory
+        self.idle_rooms = idle_rooms
+        self.rooms = {}  # комната -> история с открытым файлом
+        self._idle = OrderedDict()  # опустевшие комнаты, самые старые первыми
+        self._lock = threading.Lock()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def get(self, room):
+        """Возвращает историю комнаты, создавая её при первом обращении."""
+        history = self.rooms.get(room)
+        if history is None:
+            with self._lock:
+                history = self.rooms.get(room)
+                if history is None:
+                    history = self._idle.pop(room, None)
+                    if history is not None:
+                        history.reopen()
+                    else:
+                        path = None
+                        if self.directory is not None:
+                            path = os.path.join(self.directory, quote(room, safe="") + ".log")
+                        history = RoomHistory(self.capacity, path)
+                    self.rooms[room] = history
+        return history
+
+    def release(self, room):
+        """Закрывает историю опустевшей комнаты и откладывает её в очередь."""
+        with self._lock:
+            history = self.rooms.pop(room, None)
+            if history is None:
+                return
+            history.close()
+            self._idle[room] = history
+            if len(self._idle) > self.idle_rooms:
+                self._idle.popitem(last=False)
+
+    def close(self):
+        for history in self.rooms.values():
+            history.close()
+
+
+def replay(history, request):
+    """Выбирает сообщения для нового участника по его join или join_room.
+
+    "since": курсор — всё после него; "history": n — последние n сообщений;
+    без них — последние REPLAY_DEFAULT.
+    """
+    if request.get("since") is not None:
+        return history.since(int(request["since"]))
+    return history.last(int(request.get("history", REPLAY_DEFAULT)))
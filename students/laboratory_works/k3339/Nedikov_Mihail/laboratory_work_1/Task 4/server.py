@@ -1,65 +1,272 @@
+import os
 import socket
+import sys
 import threading
-from utils import send_json, recv_json
+import time
+import async_server
+import cluster
+import wheel
+from history import History, replay
+from utils import FORMATS, BinaryCodec, FrameReader, choose_format, encode_json, send_frames
 
 HOST, PORT = "127.0.0.1", 9090
-clients = {}
-lock = threading.Lock()
+DEFAULT_ROOM = "general"
+rooms = {}  # имя -> Room
+rooms_lock = threading.Lock()  # только для создания и удаления комнат
+codec = BinaryCodec()  # общий для всех клиентов словарь ник -> id
+history = History()  # main() заменяет её на историю с файлами, если задан --history
+ENCODERS = {"json": encode_json, "binary": codec.encode}
 
+# Дедлайны чтения: колесо таймеров и его состояние под одной блокировкой.
+timers = wheel.TimerWheel()
+timers_lock = threading.Lock()
+pinged = set()  # сокеты, которым отправлен ping без ответа
+conn_formats = {}  # сокет -> формат кадров; есть только после join
+# Блокировка отправки на каждый сокет: кадры из разных потоков не
+# перемешиваются, а кадры рассылки не обгоняют историю при входе в комнату.
+send_locks = {}
 
-def broadcast(sender_conn, obj, include_sender=False):
-    """Отправляет сообщение всем клиентам, кроме отправителя по умолчанию."""
-    with lock:
-        targets = [c for c in clients.keys() if include_sender or c is not sender_conn]
 
+class Room:
+    """Участники одной комнаты под собственной блокировкой.
+
+    Вход, выход и рассылка в разных комнатах не мешают друг другу, а
+    стоимость рассылки зависит только от размера комнаты. История комнаты
+    тоже меняется только под self.lock.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.members = {}  # сокет -> (ник, формат кадров)
+        self.lock = threading.Lock()
+        self.history = history.get(name)
+        self.closed = False  # комната удалена из rooms, входить в неё нельзя
+
+
+def enter_room(conn, name, nick, fmt, greeting=(), request=None):
+    """Добавляет клиента в комнату и возвращает её.
+
+    Клиенту отправляются greeting, для бинарного формата ники участников
+    комнаты и история по параметрам из request. Кадры собираются под
+    room.lock вместе с регистрацией, а отправляются уже без неё, под
+    блокировкой отправки клиента: медленный клиент не держит комнату, а
+    кадры рассылки ждут этой блокировки и приходят только после истории.
+    """
+    send_lock = send_locks[conn]
+    while True:
+        with rooms_lock:
+            room = rooms.get(name)
+            if room is None:
+                room = rooms[name] = Room(name)
+        with room.lock:
+            if room.closed:
+                continue  # комнату удалили между двумя блокировками
+            frames = list(greeting)
+            entries = replay(room.history, request or {})
+            if fmt == "binary":
+                frames += codec.user_frames(
+                    [other for other, _ in room.members.values()]
+                    + [msg["user"] for msg in entries]
+                )
+            frames += [ENCODERS[fmt](msg) for msg in entries]
+            room.members[conn] = (nick, fmt)
+            send_lock.acquire()
+        try:
+            if frames:
+                send_frames(conn, frames)
+        except BaseException:
+            leave_room(conn, room)
+            raise
+        finally:
+            send_lock.release()
+        return room
+
+
+def leave_room(conn, room):
+    """Убирает клиента из комнаты; пустая комната удаляется из rooms."""
+    with room.lock:
+        entry = room.members.pop(conn, None)
+        empty = not room.members
+    if empty:
+        with rooms_lock, room.lock:
+            if not room.members and rooms.get(room.name) is room:
+                room.closed = True
+                del rooms[room.name]
+                history.release(room.name)  # Room(name) создаётся тоже под rooms_lock
+    return entry
+
+
+def broadcast(room, sender_conn, obj, include_sender=False, formats=FORMATS):
+    """Отправляет сообщение участникам комнаты, кроме отправителя по умолчанию.
+
+    Сообщение сериализуется один раз на формат, и все получатели этого
+    формата отправляют один и тот же буфер через memoryview, без копий.
+    Сообщения чата перед рассылкой попадают в историю комнаты.
+    """
+    with room.lock:
+        if obj["type"] == "chat":
+            room.history.append(obj)
+        targets = [
+            (c, fmt) for c, (_, fmt) in room.members.items()
+            if fmt in formats and (include_sender or c is not sender_conn)
+        ]
+
+    frames = {}
     dead = []
-    for connection in targets:
+    for connection, fmt in targets:
+        frame = frames.get(fmt)
+        if frame is None:
+            frame = frames[fmt] = memoryview(ENCODERS[fmt](obj))
+        send_lock = send_locks.get(connection)
+        if send_lock is None:
+            continue  # клиент уже отключился
         try:
-            send_json(connection, obj)
+            with send_lock:
+                connection.sendall(frame)
         except Exception:
             dead.append(connection)
 
     if dead:
-        with lock:
+        with room.lock:
             for connection in dead:
-                if connection in clients:
-                    clients.pop(connection, None)
+                room.members.pop(connection, None)
                 try:
                     connection.close()
                 except Exception:
                     pass
 
 
+def announce(room, conn, nick, text):
+    """Сообщает комнате о новом участнике: id ника и системное сообщение."""
+    broadcast(
+        room, conn, {"type": "user", "id": codec.ids[nick], "user": nick},
+        include_sender=True, formats=("binary",),
+    )
+    broadcast(room, conn, {"type": "system", "text": text}, include_sender=True)
+
+
+def touch(conn):
+    """Отмечает входящий кадр: дедлайн чтения снова через IDLE_TIMEOUT."""
+    with timers_lock:
+        pinged.discard(conn)
+        timers.schedule(conn, wheel.IDLE_TIMEOUT)
+
+
+def reap_idle():
+    """Раз в тик проверяет истёкшие дедлайны чтения.
+
+    Молчащему клиенту отправляется ping; если и на него нет ответа за
+    PING_TIMEOUT, или клиент так и не прислал join, сокет закрывается
+    через shutdown, и поток клиента сам убирает его из комнаты.
+
+    Ping идёт под блокировкой отправки сокета, но без ожидания: если она
+    занята, в сокет как раз что-то пишется, и ping откладывается на
+    PING_TIMEOUT. Ping, не поместившийся в буфер сокета целиком, оставил бы
+    в потоке оборванный кадр, поэтому такой клиент тоже отключается.
+    """
+    while True:
+        time.sleep(timers.tick)
+        with timers_lock:
+            for conn in timers.advance():
+                fmt = conn_formats.get(conn)
+                send_lock = send_locks.get(conn)
+                if fmt is None or conn in pinged or send_lock is None:
+                    _shutdown(conn)
+                    continue
+                if not send_lock.acquire(blocking=False):
+                    timers.schedule(conn, wheel.PING_TIMEOUT)
+                    continue
+                try:
+                    frame = ENCODERS[fmt]({"type": "ping"})
+                    # Не ждём: если буфер сокета полон, клиент всё равно не читает.
+                    complete = conn.send(frame, socket.MSG_DONTWAIT) == len(frame)
+                except OSError:
+                    complete = False
+                finally:
+                    send_lock.release()
+                if not complete:
+                    _shutdown(conn)
+                    continue
+                pinged.add(conn)
+                timers.schedule(conn, wheel.PING_TIMEOUT)
+
+
+def _shutdown(conn):
+    """Закрывает сокет на чтение и запись; поток клиента увидит это в recv."""
+    try:
+        conn.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
 def handle_client(conn, addr):
-    """Регистрирует клиента, читает его сообщения и отправляет их в чат."""
+    """Регистрирует клиента, читает его сообщения и отправляет их в комнату.
+
+    Команды join_room и leave_room переводят клиента в другую комнату или
+    обратно в общую; в каждый момент клиент состоит ровно в одной комнате.
+    """
     print("Подключился:", addr)
-    nick = None
+    room = None
+    frames = FrameReader()
+    send_locks[conn] = threading.Lock()
+    with timers_lock:
+        timers.schedule(conn, wheel.HANDSHAKE_TIMEOUT)
     try:
-        hello = recv_json(conn)
-        if hello and hello.get("type") == "join":
-            nick = hello.get("user", f"User{addr[1]}")
-            with lock:
-                clients[conn] = nick
-            broadcast(
-                conn,
-                {"type": "system", "text": f"*** {nick} зашел в чат"},
-                include_sender=True,
-            )
+        hello = frames.recv_message(conn)
+        if not hello or hello.get("type") != "join":
+            return
+        # В историю и словарь кодека попадают только строки: число или
+        # список там сломал бы двоичное кодирование для всех в комнате.
+        nick = str(hello.get("user", f"User{addr[1]}"))
+        fmt = choose_format(hello.get("formats"))
+        with timers_lock:
+            conn_formats[conn] = fmt
+        touch(conn)
+        name = str(hello.get("room") or DEFAULT_ROOM)
+        codec.intern(nick)
+        greeting = []
+        if "formats" in hello:
+            greeting.append(encode_json({"type": "welcome", "format": fmt, "room": name}))
+        room = enter_room(conn, name, nick, fmt, greeting, hello)
+        if fmt == "binary":
+            frames.decode = codec.decode
+        announce(room, conn, nick, f"*** {nick} зашел в чат")
         while True:
-            msg = recv_json(conn)
-            if msg is None:
-                break
-            if msg.get("type") == "leave":
+            msg = frames.recv_message(conn)
+            if msg is None or msg.get("type") == "leave":
                 break
+            touch(conn)
+            if msg.get("type") == "ping":
+                with send_locks[conn]:
+                    conn.sendall(ENCODERS[fmt]({"type": "pong"}))
+                continue
+            if msg.get("type") == "pong":
+                continue
+            if msg.get("type") in ("join_room", "leave_room"):
+                name = str(msg.get("room") or DEFAULT_ROOM)
+                if msg["type"] == "leave_room":
+                    name = DEFAULT_ROOM
+                if name == room.name:
+                    continue
+                leave_room(conn, room)
+                broadcast(room, conn, {"type": "system", "text": f"*** {nick} перешел в комнату {name}"})
+                room = enter_room(conn, name, nick, fmt, request=msg)
+                announce(room, conn, nick, f"*** {nick} зашел в комнату {name}")
+                continue
             print(f"{nick}: {msg}")
-            broadcast(conn, {"type": "chat", "user": nick, "text": msg.get("text", "")})
+            broadcast(room, conn, {"type": "chat", "user": nick, "text": str(msg.get("text", ""))})
+    except (ConnectionError, ValueError):
+        pass
     finally:
-        left_nick = None
-        with lock:
-            if conn in clients:
-                left_nick = clients.pop(conn)
-        if left_nick:
-            broadcast(conn, {"type": "system", "text": f"*** {left_nick} вышел из чата"})
+        if room is not None:
+            entry = leave_room(conn, room)
+            if entry:
+                broadcast(room, conn, {"type": "system", "text": f"*** {entry[0]} вышел из чата"})
+        with timers_lock:
+            timers.cancel(conn)
+            pinged.discard(conn)
+            conn_formats.pop(conn, None)
+        send_locks.pop(conn, None)
         try:
             conn.close()
         except Exception:
@@ -67,12 +274,39 @@ def handle_client(conn, addr):
 
 
 def main():
-    """Запускает TCP-сервер и создает поток на каждого подключившегося клиента."""
+    """Запускает TCP-сервер и создает поток на каждого подключившегося клиента.
+
+    python server.py asyncio [drop|disconnect] запускает вместо этого
+    асинхронный сервер из async_server.py, а python server.py cluster N
+    [drop|disconnect] — N асинхронных воркеров из cluster.py на одном порту.
+    С --history DIR история комнат сохраняется в файлы в DIR и переживает
+    перезапуск.
+    """
+    global history
+    args = sys.argv[1:]
+    history_dir = None
+    if "--history" in args:
+        i = args.index("--history")
+        history_dir = args[i + 1]
+        del args[i:i + 2]
+        history = History(directory=history_dir)
+
+    if args and args[0] == "asyncio":
+        policy = args[1] if len(args) > 1 else "drop"
+        async_server.run(HOST, PORT, policy, history_dir)
+        return
+    if args and args[0] == "cluster":
+        workers = int(args[1]) if len(args) > 1 else os.cpu_count()
+        policy = args[2] if len(args) > 2 else "drop"
+        cluster.run(HOST, PORT, workers, policy, history_dir)
+        return
+
     srv = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     srv.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     srv.bind((HOST, PORT))
     srv.listen()
     print(f"Сервер слушает {HOST}:{PORT}")
+    threading.Thread(target=reap_idle, daemon=True).start()
 
     while True:
         conn, addr = srv.accept()
@@ -1,23 +1,358 @@
+import asyncio
 import json
+import struct
+import threading
+
+HEADER = struct.Struct(">I")  # длина кадра, big-endian
+HEADER_SIZE = HEADER.size
+MAX_FRAME = 1024 * 1024  # больше этого кадр считается ошибкой протокола
+BUFFER_SIZE = 64 * 1024
+
+# Форматы тела кадра в порядке предпочтения сервера; JSON понимают все клиенты.
+FORMATS = ("binary", "json")
+# Бинарный кадр начинается с байта типа сообщения.
+MSG_CHAT, MSG_SYSTEM, MSG_LEAVE, MSG_USER = 1, 2, 3, 4
+MSG_JOIN_ROOM, MSG_LEAVE_ROOM = 5, 6
+MSG_PING, MSG_PONG = 7, 8
+
+
+class FrameError(ValueError):
+    """Кадр нарушает протокол: например, длиннее MAX_FRAME."""
+
+
+class FrameReader:
+    """Читает кадры "длина + JSON" из потока через заранее выделенный буфер.
+
+    Данные принимаются прямо в bytearray через recv_into, поэтому один recv
+    может принести сразу несколько кадров, а длинное сообщение не собирается
+    из кусков конкатенацией. Прочитанная часть буфера освобождается сдвигом
+    хвоста в начало; под кадр длиннее буфера он один раз расширяется.
+    """
+
+    def __init__(self, max_frame=MAX_FRAME, size=BUFFER_SIZE, decode=None):
+        self.max_frame = max_frame
+        self.decode = decode or decode_json  # меняется после выбора формата в join
+        self._buf = bytearray(size)
+        self._view = memoryview(self._buf)
+        self._start = 0  # начало непрочитанных данных
+        self._end = 0  # конец принятых данных
+
+    def _pending_length(self):
+        """Длина тела ожидаемого кадра или None, если заголовок ещё не принят."""
+        if self._end - self._start < HEADER_SIZE:
+            return None
+        length = HEADER.unpack_from(self._buf, self._start)[0]
+        if length > self.max_frame:
+            raise FrameError(f"Frame of {length} bytes exceeds limit {self.max_frame}")
+        return length
+
+    def next_frame(self):
+        """Возвращает memoryview на тело следующего кадра или None.
+
+        Представление действительно до следующего приёма данных.
+        """
+        length = self._pending_length()
+        if length is None or self._end - self._start < HEADER_SIZE + length:
+            return None
+        head = self._start + HEADER_SIZE
+        self._start = head + length
+        return self._view[head:self._start]
+
+    def _reserve(self, extra=0):
+        """Освобождает место в конце буфера и возвращает memoryview на него.
+
+        Места хватает на ожидаемый кадр целиком и ещё на extra байт.
+        """
+        available = self._end - self._start
+        if not available:
+            self._start = self._end = 0
+        needed = max(HEADER_SIZE + (self._pending_length() or 0), available + extra)
+        if self._start + needed > len(self._buf) or self._end == len(self._buf):
+            # Сдвигаем непрочитанный хвост в начало буфера.
+            self._buf[:available] = self._view[self._start:self._end]
+            self._start, self._end = 0, available
+        if needed > len(self._buf):
+            self._view.release()
+            self._buf.extend(bytes(needed - len(self._buf)))
+            self._view = memoryview(self._buf)
+        return self._view[self._end:]
+
+    def recv_from(self, conn):
+        """Принимает данные из сокета; возвращает число байт (0 — конец потока)."""
+        with self._reserve() as free:
+            received = conn.recv_into(free)
+        self._end += received
+        return received
+
+    def feed(self, data):
+        """Добавляет уже полученные байты, например из asyncio.StreamReader."""
+        with self._reserve(len(data)) as free:
+            free[:len(data)] = data
+        self._end += len(data)
+
+    def free_space(self):
+        """Сколько байт можно принять без сдвига и расширения буфера."""
+        with self._reserve() as free:
+            return len(free)
+
+    def recv_message(self, conn):
+        """Возвращает следующее сообщение из сокета или None, если поток закрыт."""
+        while True:
+            frame = self.next_frame()
+            if frame is not None:
+                return self.decode(frame)
+            if not self.recv_from(conn):
+                return None
+
+    async def read_message(self, reader):
+        """То же для asyncio.StreamReader."""
+        while True:
+            frame = self.next_frame()
+            if frame is not None:
+                return self.decode(frame)
+            try:
+                data = await reader.read(self.free_space())
+            except ConnectionError:
+                return None
+            if not data:
+                return None
+            self.feed(data)
+
+
+def recv_exactly(conn, size):
+    """Принимает ровно size байт или возвращает None, если поток закрылся."""
+    buf = bytearray(size)
+    view = memoryview(buf)
+    received = 0
+    while received < size:
+        count = conn.recv_into(view[received:])
+        if not count:
+            return None
+        received += count
+    return buf
 
 
 def recv_json(conn):
-    """Принимает префикс длины и возвращает JSON-объект или None."""
-    raw_len = conn.recv(4)
-    if not raw_len:
-        return None
+    """Принимает префикс длины и возвращает JSON-объект или None.
 
+    Читает ровно один кадр и ничего сверх него, поэтому подходит для разовых
+    вызовов; для потока сообщений выгоднее FrameReader.
+    """
+    raw_len = recv_exactly(conn, HEADER_SIZE)
+    if raw_len is None:
+        return None
     msg_len = int.from_bytes(raw_len, "big")
-    data = b""
-    while len(data) < msg_len:
-        packet = conn.recv(msg_len - len(data))
-        if not packet:
-            return None
-        data += packet
+    if msg_len > MAX_FRAME:
+        raise FrameError(f"Frame of {msg_len} bytes exceeds limit {MAX_FRAME}")
+    data = recv_exactly(conn, msg_len)
+    if data is None:
+        return None
+    return json.loads(data.decode("utf-8"))
+
+
+async def recv_json_async(reader):
+    """То же, что recv_json, но читает из asyncio.StreamReader."""
+    try:
+        raw_len = await reader.readexactly(4)
+        data = await reader.readexactly(int.from_bytes(raw_len, "big"))
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return None
     return json.loads(data.decode("utf-8"))
 
 
+def decode_json(payload):
+    """Декодирует тело JSON-кадра; сообщение должно быть объектом."""
+    obj = json.loads(str(payload, "utf-8"))
+    if not isinstance(obj, dict):
+        raise ValueError("Message must be a JSON object")
+    return obj
+
+
+def encode_json(obj):
+    """Сериализует объект в JSON и добавляет префикс длины."""
+    data = json.dumps(obj).encode("utf-8")
+    return len(data).to_bytes(4, "big") + data
+
+
 def send_json(conn, obj):
     """Сериализует объект в JSON и отправляет его с длиной в префиксе."""
-    data = json.dumps(obj).encode("utf-8")
-    conn.sendall(len(data).to_bytes(4, "big") + data)
+    conn.sendall(encode_json(obj))
+
+
+def send_frames(conn, frames):
+    """Отправляет несколько готовых кадров одним вызовом sendmsg (writev).
+
+    Кадры не склеиваются в новый буфер: ядру передаются memoryview на них,
+    а при частичной отправке срез сдвигается без копирования.
+    """
+    views = [memoryview(frame) for frame in frames]
+    if not hasattr(conn, "sendmsg"):
+        for view in views:
+            conn.sendall(view)
+        return
+    first = 0
+    while first < len(views):
+        sent = conn.sendmsg(views[first:])
+        while first < len(views) and sent >= len(views[first]):
+            sent -= len(views[first])
+            first += 1
+        if sent:
+            views[first] = views[first][sent:]
+
+
+def encode_varint(value):
+    """Кодирует неотрицательное число в varint (7 бит на байт, LEB128)."""
+    out = bytearray()
+    while value > 0x7F:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def decode_varint(data, pos):
+    """Читает varint из data с позиции pos; возвращает (число, новая позиция)."""
+    value = shift = 0
+    while True:
+        if pos >= len(data) or shift > 63:
+            raise FrameError("Truncated varint")
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def _encode_text(text):
+    if not isinstance(text, str):
+        raise ValueError(f"Expected str, got {type(text).__name__}")
+    data = text.encode("utf-8")
+    return encode_varint(len(data)) + data
+
+
+def _decode_text(data, pos):
+    length, pos = decode_varint(data, pos)
+    if pos + length > len(data):
+        raise FrameError("Truncated string")
+    return str(data[pos:pos + length], "utf-8"), pos + length
+
+
+class BinaryCodec:
+    """Бинарный формат сообщений чата, выбираемый в рукопожатии join.
+
+    Тело кадра: байт типа, затем поля. Строки передаются как varint-длина
+    и UTF-8, а вместо ника в сообщении чата идёт числовой id: сервер
+    интернирует ники и заранее рассылает сообщения MSG_USER "id -> ник".
+
+        MSG_CHAT    id (varint, от клиента 0), seq (0 — нет), текст
+        MSG_SYSTEM  текст
+        MSG_LEAVE   —
+        MSG_USER    id, ник
+        MSG_JOIN_ROOM   имя комнаты, history + 1, since + 1 (0 — не задано)
+        MSG_LEAVE_ROOM  —
+        MSG_PING, MSG_PONG  —
+
+    Декодированные сообщения — такие же словари, как в JSON-формате.
+    """
+
+    def __init__(self):
+        self.ids = {}  # ник -> id, заполняет сервер
+        self.names = {}  # id -> ник, заполняет клиент из MSG_USER
+        self._lock = threading.Lock()  # потоковый сервер выдаёт id из разных потоков
+
+    def intern(self, nick):
+        """Возвращает постоянный id ника, выдавая новый при первой встрече."""
+        user_id = self.ids.get(nick)
+        if user_id is None:
+            with self._lock:
+                user_id = self.ids.get(nick)
+                if user_id is None:
+                    user_id = self.ids[nick] = len(self.ids) + 1
+        return user_id
+
+    def user_frames(self, nicks):
+        """Кадры MSG_USER, которые сообщают клиенту id переданных ников."""
+        return [
+            self.encode({"type": "user", "id": self.intern(nick), "user": nick})
+            for nick in dict.fromkeys(nicks)
+        ]
+
+    def encode(self, obj):
+        """Сериализует сообщение в кадр с префиксом длины."""
+        kind = obj["type"]
+        if kind == "chat":
+            user = obj.get("user")
+            user_id = self.intern(user) if user is not None else 0
+            body = (
+                bytes((MSG_CHAT,)) + encode_varint(user_id)
+                + encode_varint(obj.get("seq", 0)) + _encode_text(obj["text"])
+            )
+        elif kind == "system":
+            body = bytes((MSG_SYSTEM,)) + _encode_text(obj["text"])
+        elif kind == "leave":
+            body = bytes((MSG_LEAVE,))
+        elif kind == "user":
+            body = bytes((MSG_USER,)) + encode_varint(obj["id"]) + _encode_text(obj["user"])
+        elif kind == "join_room":
+            body = bytes((MSG_JOIN_ROOM,)) + _encode_text(obj["room"]) + b"".join(
+                encode_varint(obj[key] + 1 if obj.get(key) is not None else 0)
+                for key in ("history", "since")
+            )
+        elif kind == "leave_room":
+            body = bytes((MSG_LEAVE_ROOM,))
+        elif kind == "ping":
+            body = bytes((MSG_PING,))
+        elif kind == "pong":
+            body = bytes((MSG_PONG,))
+        else:
+            raise ValueError(f"Message type {kind!r} has no binary form")
+        return HEADER.pack(len(body)) + body
+
+    def decode(self, payload):
+        """Разбирает тело бинарного кадра в словарь сообщения."""
+        if not payload:
+            raise FrameError("Empty binary frame")
+        kind = payload[0]
+        if kind == MSG_CHAT:
+            user_id, pos = decode_varint(payload, 1)
+            seq, pos = decode_varint(payload, pos)
+            text, _ = _decode_text(payload, pos)
+            msg = {"type": "chat", "text": text}
+            if user_id:
+                msg["user"] = self.names.get(user_id, f"#{user_id}")
+            if seq:
+                msg["seq"] = seq
+            return msg
+        if kind == MSG_SYSTEM:
+            return {"type": "system", "text": _decode_text(payload, 1)[0]}
+        if kind == MSG_LEAVE:
+            return {"type": "leave"}
+        if kind == MSG_USER:
+            user_id, pos = decode_varint(payload, 1)
+            nick, _ = _decode_text(payload, pos)
+            self.names[user_id] = nick
+            return {"type": "user", "id": user_id, "user": nick}
+        if kind == MSG_JOIN_ROOM:
+            room, pos = _decode_text(payload, 1)
+            msg = {"type": "join_room", "room": room}
+            for key in ("history", "since"):
+                value, pos = decode_varint(payload, pos)
+                if value:
+                    msg[key] = value - 1
+            return msg
+        if kind == MSG_LEAVE_ROOM:
+            return {"type": "leave_room"}
+        if kind == MSG_PING:
+            return {"type": "ping"}
+        if kind == MSG_PONG:
+            return {"type": "pong"}
+        raise FrameError(f"Unknown binary message type {kind}")
+
+
+def choose_format(offered):
+    """Выбирает формат из списка клиента; без списка остаётся JSON."""
+    for fmt in FORMATS:
+        if fmt in (offered or ()):
+            return fmt
+    return "json"
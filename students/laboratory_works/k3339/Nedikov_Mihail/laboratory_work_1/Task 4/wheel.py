@@ -0,0 +1,63 @@
+import math
+
+# Таймауты соединений чата, в секундах.
+HANDSHAKE_TIMEOUT = 10  # столько ждём join после подключения
+IDLE_TIMEOUT = 30  # без входящих кадров столько — отправляем ping
+PING_TIMEOUT = 10  # столько ждём любого кадра в ответ на ping
+TICK = 1.0
+SLOTS = 64
+
+
+class TimerWheel:
+    """Колесо таймеров для дедлайнов соединений.
+
+    Время делится на тики, у колеса slots ячеек; таймер кладётся в ячейку,
+    до которой осталось нужное число тиков, а если задержка больше оборота —
+    с числом оставшихся оборотов. Постановка, перенос и отмена таймера —
+    O(1), а advance() за тик смотрит только одну ячейку.
+
+    Ключи — любые хешируемые объекты, обычно сокет или writer клиента.
+    Колесо не потокобезопасно: потоковый сервер вызывает его под своей
+    блокировкой.
+    """
+
+    def __init__(self, tick=TICK, slots=SLOTS):
+        self.tick = tick
+        self.slots = [{} for _ in range(slots)]  # ключ -> оставшиеся обороты
+        self.cursor = 0
+        self.where = {}  # ключ -> номер ячейки
+
+    def __len__(self):
+        return len(self.where)
+
+    def schedule(self, key, delay):
+        """Ставит таймер ключа на delay секунд, заменяя прежний.
+
+        Текущий тик уже частично прошёл, поэтому добавляем ещё один: таймер
+        срабатывает не раньше чем через delay и не позже чем через delay + tick.
+        """
+        self.cancel(key)
+        ticks = math.ceil(delay / self.tick) + 1
+        slot = (self.cursor + ticks) % len(self.slots)
+        self.slots[slot][key] = (ticks - 1) // len(self.slots)
+        self.where[key] = slot
+
+    def cancel(self, key):
+        """Снимает таймер ключа, если он есть."""
+        slot = self.where.pop(key, None)
+        if slot is not None:
+            del self.slots[slot][key]
+
+    def advance(self):
+        """Сдвигает колесо на один тик и возвращает ключи истёкших таймеров."""
+        self.cursor = (self.cursor + 1) % len(self.slots)
+        bucket = self.slots[self.cursor]
+        expired = []
+        for key, rounds in list(bucket.items()):
+            if rounds:
+                bucket[key] = rounds - 1
+            else:
+                del bucket[key]
+                del self.where[key]
+                expired.append(key)
+        return expired
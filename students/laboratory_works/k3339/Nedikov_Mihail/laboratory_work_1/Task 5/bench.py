@@ -0,0 +1,157 @@
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from server import MAX_KEEPALIVE_REQUESTS
+
+# Нагрузочный стенд: сравнивает движки MyHTTPServer (threads и asyncio).
+# Запуск: python bench.py [число_простаивающих_соединений] [число_запросов]
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+HOST = "127.0.0.1"
+CONCURRENCY = 50
+PIPELINE_DEPTH = 10
+REQUEST = f"GET /grades HTTP/1.1\r\nHost: {HOST}\r\n\r\n".encode()
+
+
+def free_port():
+    """Возвращает свободный TCP-порт на localhost."""
+    with socket.socket() as s:
+        s.bind((HOST, 0))
+        return s.getsockname()[1]
+
+
+def start_server(engine, port):
+    """Запускает server.py в отдельном процессе и ждёт, пока он начнёт слушать."""
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(BASE_DIR, "server.py"), HOST, str(port), "bench", engine],
+        stdout=subprocess.DEVNULL,
+    )
+    for _ in range(100):
+        try:
+            socket.create_connection((HOST, port), timeout=0.1).close()
+            return proc
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError(f"server with engine {engine} did not start")
+
+
+def rss_kb(pid):
+    """Читает резидентную память процесса из /proc (только Linux)."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+async def open_idle(port, count):
+    """Открывает count соединений, которые ничего не отправляют."""
+    conns = []
+    for _ in range(count):
+        try:
+            conns.append(await asyncio.open_connection(HOST, port))
+        except OSError as err:
+            print(f"  удалось открыть только {len(conns)} соединений: {err}")
+            break
+    return conns
+
+
+async def read_response(reader):
+    """Читает один ответ сервера, ориентируясь на Content-Length."""
+    head = await reader.readuntil(b"\r\n\r\n")
+    length = 0
+    for line in head.split(b"\r\n"):
+        name, _, value = line.partition(b":")
+        if name.strip().lower() == b"content-length":
+            length = int(value)
+    await reader.readexactly(length)
+
+
+async def fetch(port):
+    """Выполняет один GET /grades в новом соединении."""
+    reader, writer = await asyncio.open_connection(HOST, port)
+    writer.write(REQUEST)
+    await writer.drain()
+    await read_response(reader)
+    writer.close()
+
+
+async def worker(port, count, depth):
+    """Выполняет count запросов; depth=0 — новое соединение на каждый запрос.
+
+    При depth >= 1 запросы идут по постоянному соединению пачками по depth
+    штук (depth > 1 — конвейер), с переподключением после лимита сервера.
+    """
+    if depth == 0:
+        for _ in range(count):
+            await fetch(port)
+        return
+    while count > 0:
+        reader, writer = await asyncio.open_connection(HOST, port)
+        per_conn = min(count, MAX_KEEPALIVE_REQUESTS)
+        sent = 0
+        while sent < per_conn:
+            batch = min(depth, per_conn - sent)
+            writer.write(REQUEST * batch)
+            await writer.drain()
+            for _ in range(batch):
+                await read_response(reader)
+            sent += batch
+        writer.close()
+        count -= per_conn
+
+
+async def run_requests(port, total, depth=0):
+    """Прогоняет total запросов с CONCURRENCY клиентами и возвращает req/s."""
+    per_worker = max(total // CONCURRENCY, 1)
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(port, per_worker, depth) for _ in range(CONCURRENCY)))
+    return per_worker * CONCURRENCY / (time.perf_counter() - start)
+
+
+async def bench(engine, idle, total):
+    port = free_port()
+    proc = start_server(engine, port)
+    try:
+        base = rss_kb(proc.pid)
+        conns = await open_idle(port, idle)
+        await asyncio.sleep(0.5)
+        loaded = rss_kb(proc.pid)
+        for _, writer in conns:
+            writer.close()
+        rps_close = await run_requests(port, total)
+        rps_keep = await run_requests(port, total, depth=1)
+        rps_pipe = await run_requests(port, total, depth=PIPELINE_DEPTH)
+    finally:
+        proc.kill()
+        proc.wait()
+
+    print(f"{engine}:")
+    for label, rps in (
+        ("новое соединение на запрос", rps_close),
+        ("keep-alive", rps_keep),
+        (f"конвейер по {PIPELINE_DEPTH}", rps_pipe),
+    ):
+        print(f"  {label + ':':<28}{rps:8.0f} req/s")
+    if base is not None and loaded is not None:
+        per_conn = (loaded - base) / max(len(conns), 1)
+        print(f"  RSS {base} -> {loaded} KiB ({per_conn:.1f} KiB на простаивающее соединение)")
+
+
+def main():
+    idle = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    total = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    print(f"{idle} простаивающих соединений, {total} запросов GET /grades")
+    for engine in ("threads", "asyncio"):
+        asyncio.run(bench(engine, idle, total))
+
+
+if __name__ == "__main__":
+    main()
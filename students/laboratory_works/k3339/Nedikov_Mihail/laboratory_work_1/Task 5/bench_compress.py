@@ -0,0 +1,50 @@
+import json
+import os
+import sys
+import time
+
+from compression import ENCODINGS, compress
+
+# Бенчмарк сжатия ответов: байты на проводе и время процессора на ответ.
+# Запуск: python bench_compress.py [число_предметов]
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_PAGE = os.path.join(BASE_DIR, "..", "Task 3", "static", "index.html")
+
+
+def grades_json(count):
+    """Тело GET /grades для count предметов по 10 оценок."""
+    data = [
+        {"id": i, "title": f"Дисциплина {i}", "grades": [str(i % 5 + 1)] * 10}
+        for i in range(1, count + 1)
+    ]
+    return json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+def cpu_per_call(fn, repeat):
+    start = time.process_time()
+    for _ in range(repeat):
+        fn()
+    return (time.process_time() - start) / repeat * 1e6
+
+
+def report(label, body):
+    print(f"{label}: {len(body)} байт без сжатия")
+    for encoding in ENCODINGS:
+        encoded = compress(body, encoding)
+        repeat = max(1, 2_000_000 // max(len(body), 1))
+        cost = cpu_per_call(lambda: compress(body, encoding), repeat)
+        ratio = len(encoded) / len(body) * 100
+        print(f"  {encoding:<8}{len(encoded):>9} байт ({ratio:5.1f}%), {cost:9.1f} мкс CPU на ответ")
+    print("  из кэша: сжатие 0 мкс, пока данные не изменились")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    with open(STATIC_PAGE, "rb") as f:
+        report("Task 3 index.html", f.read())
+    for size in (10, count):
+        report(f"GET /grades, {size} предметов", grades_json(size))
+
+
+if __name__ == "__main__":
+    main()
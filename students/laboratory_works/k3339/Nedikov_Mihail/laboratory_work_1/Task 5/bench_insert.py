@@ -0,0 +1,69 @@
+import gc
+import io
+import os
+import sys
+import tempfile
+import time
+from email.parser import Parser
+from urllib.parse import quote
+
+import server
+
+# Микробенчмарк handle_set_subject: время вставки не должно расти с числом
+# предметов. Запуск: python bench_insert.py [размер1 размер2 ...]
+OPS = 2000
+HEADERS = Parser().parsestr("Host: localhost\r\n\r\n")
+
+
+def make_request(title, grade):
+    """Собирает POST-запрос с параметрами в строке запроса."""
+    target = f"/set_subject?title={quote(title)}&grade={grade}"
+    return server.Request("POST", target, "HTTP/1.1", HEADERS, io.BytesIO())
+
+
+def measure(srv, titles):
+    """Возвращает (среднее, наибольшее) время вызова handle_set_subject в мкс.
+
+    Снимки журнала не отключаются: наибольшее время показывает, насколько
+    запись задерживается, пока снимок делается в фоне.
+    """
+    requests = [make_request(title, 5) for title in titles]
+    worst = 0
+    start = time.perf_counter()
+    for req in requests:
+        began = time.perf_counter()
+        srv.handle_set_subject(req)
+        worst = max(worst, time.perf_counter() - began)
+    return (time.perf_counter() - start) / len(requests) * 1e6, worst * 1e6
+
+
+def bench(size):
+    with tempfile.TemporaryDirectory() as tmp:
+        # Данные сервера пишем во временный каталог, а не рядом с grades.json.
+        server.DATA_FILE = os.path.join(tmp, "grades.json")
+        server.JOURNAL_FILE = os.path.join(tmp, "grades.journal")
+        srv = server.MyHTTPServer("localhost", 0, "bench")
+        try:
+            # Заполняем напрямую через _apply, чтобы не ждать журнал.
+            with srv._lock:
+                for i in range(size):
+                    srv._apply({"id": srv._next_id, "title": f"subject-{i}", "grade": "5"})
+            # Как сервер после загрузки данных (см. MyHTTPServer._load_data).
+            gc.collect()
+            gc.freeze()
+            insert = measure(srv, [f"new-{i}" for i in range(OPS)])
+            update = measure(srv, [f"subject-{i * 7 % size}" for i in range(OPS)])
+        finally:
+            srv.close()
+    print(f"{size:>8} предметов: новая дисциплина {insert[0]:6.1f} мкс (макс. {insert[1]:8.0f}), "
+          f"оценка к существующей {update[0]:6.1f} мкс (макс. {update[1]:8.0f})")
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1_000, 10_000, 100_000]
+    for size in sizes:
+        bench(size)
+
+
+if __name__ == "__main__":
+    main()
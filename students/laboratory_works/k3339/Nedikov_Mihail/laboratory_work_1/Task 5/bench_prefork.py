@@ -0,0 +1,96 @@
+import asyncio
+import http.client
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench import HOST, free_port
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from loadgen import LoadGenerator  # noqa: E402
+
+# Масштабирование режима pre-fork на GET /grades и проверка, что запись,
+# на которую уже пришёл ответ, видна следующему чтению в любом воркере.
+# Запуск: python bench_prefork.py [секунд] [воркеры ...]
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CONNECTIONS = 32
+CHECKS = 200
+# Сервер пишет данные во временный каталог, а не рядом с grades.json.
+SERVER = """
+import os, sys
+import server
+tmp, port, workers = sys.argv[1], int(sys.argv[2]), int(sys.argv[3])
+server.DATA_FILE = os.path.join(tmp, "grades.json")
+server.JOURNAL_FILE = os.path.join(tmp, "grades.journal")
+server.serve_prefork(
+    sys.argv[4], port, "bench", workers, "asyncio", store_path=os.path.join(tmp, "grades.sqlite3")
+)
+"""
+
+
+def start_server(tmp, port, workers):
+    proc = subprocess.Popen(
+        [sys.executable, "-c", SERVER, tmp, str(port), str(workers), HOST],
+        cwd=BASE_DIR, stdout=subprocess.DEVNULL, start_new_session=True,
+    )
+    for _ in range(100):
+        try:
+            http.client.HTTPConnection(HOST, port, timeout=0.1).connect()
+            return proc
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError("prefork server did not start")
+
+
+def check_writes(port):
+    """Пишет и сразу читает в новых соединениях; возвращает число устаревших чтений."""
+    stale = 0
+    for i in range(CHECKS):
+        title = f"check-{i}"
+        conn = http.client.HTTPConnection(HOST, port)
+        conn.request("POST", f"/set_subject?title={title}&grade=5")
+        conn.getresponse().read()
+        conn.close()
+        conn = http.client.HTTPConnection(HOST, port)
+        conn.request("GET", "/grades")
+        if title.encode() not in conn.getresponse().read():
+            stale += 1
+        conn.close()
+    return stale
+
+
+def bench(workers, seconds):
+    tmp = tempfile.mkdtemp()
+    shutil.copy(os.path.join(BASE_DIR, "grades.json"), tmp)
+    port = free_port()
+    proc = start_server(tmp, port, workers)
+    try:
+        gen = LoadGenerator(
+            "grades", HOST, port, CONNECTIONS, CONNECTIONS, 1, "GET /grades", timeout=5
+        )
+        elapsed = asyncio.run(gen.run(seconds, warmup=0.5))
+        stale = check_writes(port)
+    finally:
+        os.killpg(proc.pid, 9)
+        proc.wait()
+        shutil.rmtree(tmp)
+    print(
+        f"  воркеров {workers}: {gen.completed / elapsed:8.0f} GET /grades в секунду, "
+        f"p99 {gen.histogram.percentile(99)} мкс, устаревших чтений {stale} из {CHECKS}"
+    )
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3
+    counts = [int(arg) for arg in sys.argv[2:]] or sorted({1, 2, os.cpu_count() or 1})
+    print(f"{CONNECTIONS} соединений, {seconds} с на прогон, ядер: {os.cpu_count()}")
+    for workers in counts:
+        bench(workers, seconds)
+
+
+if __name__ == "__main__":
+    main()
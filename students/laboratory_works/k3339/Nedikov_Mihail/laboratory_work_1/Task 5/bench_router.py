@@ -0,0 +1,127 @@
+import gc
+import io
+import sys
+import time
+import weakref
+from email.parser import Parser
+
+from router import Router
+from server import MyHTTPServer, Request
+
+# Бенчмарк маршрутизации и разбора запроса.
+# Запуск: python bench_router.py [число_итераций]
+HEADERS = Parser().parsestr("Host: localhost\r\n\r\n")
+SIZES = (0, 100, 1000)  # лишних маршрутов сверх таблицы MyHTTPServer.ROUTES
+REPEATS = 5  # прогонов на замер, берётся лучший
+PATHS = [
+    ("GET", "/"),
+    ("POST", "/set_subject"),
+    ("GET", "/grades"),
+    ("GET", "/grades/42"),
+    ("GET", "/grades/42/stats"),
+    ("GET", "/favicon.ico"),
+    ("GET", "/missing"),
+]
+
+# Прежний способ — цепочка сравнений сверху вниз — с теми же маршрутами, что
+# в MyHTTPServer.ROUTES, и с тем же результатом, что у Router.match.
+IF_CHAIN_HEAD = """
+def match(method, path):
+    if path == "/" and method == "GET":
+        return "handle_index", {}
+    if path == "/set_subject" and method == "POST":
+        return "handle_set_subject", {}
+    if path == "/grades" and method == "GET":
+        return "handle_get_grades", {}
+    if path == "/grades/export" and method == "GET":
+        return "handle_export_grades", {}
+    if path == "/grades/stats" and method == "GET":
+        return "handle_grade_stats", {}
+    if path == "/metrics" and method == "GET":
+        return "handle_metrics", {}
+    if path.startswith("/grades/") and method == "GET":
+        subject_id, _, rest = path[len("/grades/"):].partition("/")
+        if subject_id.isdigit() and rest in ("", "stats"):
+            name = "handle_subject_stats" if rest else "handle_get_subject"
+            return name, {"subject_id": int(subject_id)}
+    if path == "/favicon.ico":
+        return "handle_favicon", {}
+"""
+
+
+def extra_routes(extra):
+    """Лишние маршруты, которые дописываются в конец таблицы."""
+    return [("GET", f"/extra/{i}", f"extra{i}") for i in range(extra)]
+
+
+def make_if_chain(extra):
+    """Цепочка if, выросшая на extra маршрутов: по одному сравнению на каждый."""
+    source = IF_CHAIN_HEAD + "".join(
+        f"    if path == {path!r} and method == {method!r}:\n        return {name!r}, {{}}\n"
+        for method, path, name in extra_routes(extra)
+    ) + "    return None, set()\n"
+    namespace = {}
+    exec(source, namespace)
+    return namespace["match"]
+
+
+def make_router(extra):
+    """Router с таблицей сервера и extra лишними маршрутами."""
+    return Router(list(MyHTTPServer.ROUTES) + extra_routes(extra))
+
+
+def per_call(fn, method, path, n):
+    """Лучшее из REPEATS время одного вызова fn, нс."""
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        for _ in range(n):
+            fn(method, path)
+        best = min(best, time.perf_counter() - start)
+    return best / n * 1e9
+
+
+def bench_routing(n):
+    """Цепочка if и Router на одинаковых таблицах: нс на вызов по путям."""
+    base = len(MyHTTPServer.ROUTES)
+    print(f"  {'маршрутов':<24}" + "".join(f"{base + extra:>16}" for extra in SIZES))
+    print(f"  {'':<24}" + f"{'if / Router':>16}" * len(SIZES))
+    matchers = [(make_if_chain(extra), make_router(extra)) for extra in SIZES]
+    last = ("GET", f"/extra/{SIZES[-1] - 1}")  # последний маршрут самой длинной таблицы
+    for method, path in PATHS + [last]:
+        cells = []
+        for if_chain, router in matchers:
+            expected = router.match(method, path)
+            if if_chain(method, path) != expected:
+                raise AssertionError(f"{method} {path}: {if_chain(method, path)} != {expected}")
+            cells.append(f"{per_call(if_chain, method, path, n):.0f} / {per_call(router.match, method, path, n):.0f}")
+        print(f"  {method + ' ' + path:<24}" + "".join(f"{cell:>16}" for cell in cells))
+
+
+def bench_parsing(n):
+    """Разбор url и query у новых запросов и проверка, что они освобождаются."""
+    start = time.perf_counter()
+    for i in range(n):
+        req = Request("GET", f"/grades?title=t{i}&grade=5", "HTTP/1.1", HEADERS, io.BytesIO())
+        req.path, req.query
+    per_req = (time.perf_counter() - start) / n * 1e9
+    print(f"  {'path + query нового Request':<32}{per_req:8.0f} нс на запрос")
+
+    req = Request("GET", "/grades?title=x", "HTTP/1.1", HEADERS, io.BytesIO())
+    req.query
+    ref = weakref.ref(req)
+    del req
+    gc.collect()
+    print(f"  Request освобождается после использования: {ref() is None}")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    print("Маршрутизация, нс на вызов (лучший из прогонов):")
+    bench_routing(n // 5)
+    print("Разбор запроса:")
+    bench_parsing(n)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+import asyncio
+import json
+from urllib.parse import unquote_plus
+
+CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_LINE = 1024
+
+
+class BodyError(ValueError):
+    """Ошибка чтения тела запроса с HTTP-статусом для ответа клиенту."""
+    def __init__(self, status, reason, message):
+        super().__init__(message)
+        self.status = status
+        self.reason = reason
+
+
+def body_framing(headers, limit):
+    """Определяет, как передано тело: ("chunked", None) или ("length", n)."""
+    encoding = headers.get("Transfer-Encoding")
+    if encoding:
+        if encoding.strip().lower() != "chunked":
+            raise BodyError(501, "Not Implemented", f"Unsupported Transfer-Encoding {encoding}")
+        return "chunked", None
+    raw = headers.get("Content-Length")
+    try:
+        length = int(raw) if raw else 0
+    except ValueError:
+        raise BodyError(400, "Bad Request", "Malformed Content-Length")
+    if length < 0:
+        raise BodyError(400, "Bad Request", "Malformed Content-Length")
+    if length > limit:
+        raise BodyError(413, "Payload Too Large", f"Body exceeds {limit} bytes")
+    return "length", length
+
+
+def parse_chunk_size(line):
+    """Разбирает строку с размером чанка (расширения после ; игнорируются)."""
+    size = line.split(b";", 1)[0].strip()
+    try:
+        return int(size, 16)
+    except ValueError:
+        raise BodyError(400, "Bad Request", "Malformed chunk size")
+
+
+def check_total(total, limit):
+    """Прерывает чтение chunked-тела, как только оно превысило лимит."""
+    if total > limit:
+        raise BodyError(413, "Payload Too Large", f"Body exceeds {limit} bytes")
+
+
+def iter_body(rfile, headers, limit):
+    """Отдаёт тело запроса из файла сокета кусками не больше CHUNK_SIZE."""
+    mode, length = body_framing(headers, limit)
+    if mode == "length":
+        while length:
+            data = rfile.read(min(length, CHUNK_SIZE))
+            if not data:
+                raise BodyError(400, "Bad Request", "Body is shorter than Content-Length")
+            length -= len(data)
+            yield data
+        return
+
+    total = 0
+    while True:
+        size = parse_chunk_size(rfile.readline(MAX_CHUNK_LINE))
+        if size == 0:
+            break
+        total += size
+        check_total(total, limit)
+        while size:
+            data = rfile.read(min(size, CHUNK_SIZE))
+            if not data:
+                raise BodyError(400, "Bad Request", "Truncated chunk")
+            size -= len(data)
+            yield data
+        rfile.readline(MAX_CHUNK_LINE)
+    # Трейлеры после последнего чанка не используются, просто пропускаем их.
+    while rfile.readline(MAX_CHUNK_LINE) not in (b"\r\n", b"\n", b""):
+        pass
+
+
+async def aiter_body(reader, headers, limit, timeout=None):
+    """То же, что iter_body, но для asyncio.StreamReader.
+
+    timeout — секунд ожидания каждого чтения: загрузка целиком может идти
+    сколько угодно долго, а молчащий клиент получает asyncio.TimeoutError.
+    """
+    def wait(read):
+        return read if timeout is None else asyncio.wait_for(read, timeout)
+
+    mode, length = body_framing(headers, limit)
+    if mode == "length":
+        while length:
+            data = await wait(reader.read(min(length, CHUNK_SIZE)))
+            if not data:
+                raise BodyError(400, "Bad Request", "Body is shorter than Content-Length")
+            length -= len(data)
+            yield data
+        return
+
+    total = 0
+    while True:
+        size = parse_chunk_size(await wait(reader.readline()))
+        if size == 0:
+            break
+        total += size
+        check_total(total, limit)
+        while size:
+            data = await wait(reader.read(min(size, CHUNK_SIZE)))
+            if not data:
+                raise BodyError(400, "Bad Request", "Truncated chunk")
+            size -= len(data)
+            yield data
+        await wait(reader.readline())
+    while await wait(reader.readline()) not in (b"\r\n", b"\n", b""):
+        pass
+
+
+class FormParser:
+    """Инкрементальный разбор application/x-www-form-urlencoded.
+
+    В памяти хранится только незавершённая пара name=value, а результат
+    совпадает с parse_qs: имя -> список значений, пустые значения пропускаются.
+    """
+    def __init__(self):
+        self._tail = b""
+        self._fields = {}
+
+    def feed(self, chunk):
+        pairs = (self._tail + chunk).split(b"&")
+        self._tail = pairs.pop()
+        for pair in pairs:
+            self._add(pair)
+
+    def close(self):
+        self._add(self._tail)
+        self._tail = b""
+        return self._fields
+
+    def _add(self, pair):
+        name, _, value = pair.partition(b"=")
+        if not name or not value:
+            return
+        try:
+            name = unquote_plus(name.decode("utf-8"))
+            value = unquote_plus(value.decode("utf-8"))
+        except UnicodeDecodeError:
+            raise BodyError(400, "Bad Request", "Form field is not valid UTF-8")
+        self._fields.setdefault(name, []).append(value)
+
+
+class JSONParser:
+    """Накопитель тела application/json, который разбирается в close().
+
+    Размер буфера ограничен лимитом тела, а результат приводится к виду
+    parse_qs (имя -> список строк), чтобы обработчики не различали форматы.
+    """
+    def __init__(self):
+        self._buf = bytearray()
+
+    def feed(self, chunk):
+        self._buf += chunk
+
+    def close(self):
+        try:
+            data = json.loads(self._buf)
+        except ValueError:
+            raise BodyError(400, "Bad Request", "Malformed JSON body")
+        if not isinstance(data, dict):
+            raise BodyError(400, "Bad Request", "JSON body must be an object")
+        return {
+            name: [_form_value(name, v) for v in value] if isinstance(value, list)
+            else [_form_value(name, value)]
+            for name, value in data.items()
+        }
+
+
+def _form_value(name, value):
+    """Строка или число из JSON как значение формы; null, bool и объекты — 400."""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    raise BodyError(400, "Bad Request", f"Field {name!r} must be a string or a number")
+
+
+def body_parser(content_type):
+    """Подбирает парсер по Content-Type или возвращает None."""
+    content_type = (content_type or "").lower()
+    if "application/x-www-form-urlencoded" in content_type:
+        return FormParser()
+    if "application/json" in content_type:
+        return JSONParser()
+    return None
@@ -0,0 +1,45 @@
+import gzip
+import zlib
+
+COMPRESS_MIN_SIZE = 1024  # меньшие ответы сжимать невыгодно
+COMPRESS_LEVEL = 6
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript")
+ENCODINGS = ("gzip", "deflate")  # в порядке предпочтения сервера
+
+
+def choose_encoding(accept_encoding):
+    """Выбирает кодирование из Accept-Encoding с учётом q-значений.
+
+    Возвращает "gzip", "deflate" или None, если клиент их не принимает.
+    """
+    if not accept_encoding:
+        return None
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+    best, best_q = None, 0.0
+    for encoding in ENCODINGS:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def is_compressible(content_type):
+    """Сжимаем только текстовые форматы: картинки и архивы уже сжаты."""
+    return bool(content_type) and content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def compress(data, encoding):
+    """Сжимает тело ответа; deflate в HTTP означает формат zlib."""
+    if encoding == "gzip":
+        return gzip.compress(data, COMPRESS_LEVEL, mtime=0)
+    return zlib.compress(data, COMPRESS_LEVEL)
@@ -0,0 +1,58 @@
+from array import array
+
+MIN_GRADE = 0
+MAX_GRADE = 100  # укладывается в array("h"), как и вся шкала баллов
+
+
+def parse_grade(value):
+    """Проверяет оценку и возвращает её как int; иначе ValueError."""
+    if isinstance(value, bool):
+        raise ValueError("grade must be an integer")
+    try:
+        grade = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("grade must be an integer") from None
+    if not MIN_GRADE <= grade <= MAX_GRADE:
+        raise ValueError(f"grade must be between {MIN_GRADE} and {MAX_GRADE}")
+    return grade
+
+
+def new_grades():
+    """Пустой компактный массив оценок: 2 байта на оценку вместо объекта str."""
+    return array("h")
+
+
+class GradeStats:
+    """Агрегаты по оценкам, обновляемые при каждой новой оценке за O(1).
+
+    Распределение хранит число оценок каждого значения; значений не больше
+    MAX_GRADE - MIN_GRADE + 1, поэтому и ответ as_dict() ограничен по размеру.
+    """
+
+    __slots__ = ("count", "total", "min", "max", "distribution")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+        self.distribution = {}  # оценка -> сколько раз поставлена
+
+    def add(self, grade):
+        self.count += 1
+        self.total += grade
+        if self.min is None or grade < self.min:
+            self.min = grade
+        if self.max is None or grade > self.max:
+            self.max = grade
+        self.distribution[grade] = self.distribution.get(grade, 0) + 1
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "min": self.min,
+            "max": self.max,
+            "mean": round(self.total / self.count, 4) if self.count else None,
+            "distribution": {str(g): n for g, n in sorted(self.distribution.items())},
+        }
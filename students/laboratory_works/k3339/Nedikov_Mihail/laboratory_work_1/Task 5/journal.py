@@ -0,0 +1,170 @@
+import json
+import os
+import threading
+
+
+class Journal:
+    """Append-only журнал изменений с групповой фиксацией (group commit).
+
+    append() только ставит запись в очередь и возвращает её номер, а
+    фоновый поток раз в flush_interval дописывает накопленную пачку в файл
+    одним write и одним fsync. Каждые compact_every записей вызывается
+    compact_fn, который сохраняет снимок данных, после чего журнал обнуляется.
+    """
+
+    def __init__(self, path, flush_interval=0.05, compact_every=1000):
+        self._path = path
+        self._flush_interval = flush_interval
+        self._compact_every = compact_every
+        self._compact_fn = None
+        self._pending = []
+        self._seq = 0  # номер последней выданной записи
+        self._committed = 0  # номер последней записи, сброшенной на диск
+        self._since_compact = 0
+        self._valid_size = None  # длина журнала без оборванного хвоста
+        self._closed = False
+        self._cond = threading.Condition()
+        self._file = None
+        self._thread = None
+
+    @property
+    def seq(self):
+        return self._seq
+
+    def replay(self, after_seq=0):
+        """Возвращает записи журнала с номером больше after_seq.
+
+        Недописанная последняя строка (обрыв при падении) отбрасывается и
+        будет отрезана от файла в start(). Целая строка без номера seq
+        возвращается как есть: её отбракует проверка записей у вызывающего.
+        """
+        records = []
+        if not os.path.exists(self._path):
+            return records
+        self._valid_size = 0
+        with open(self._path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                self._valid_size += len(line)
+                seq = record.get("seq") if isinstance(record, dict) else None
+                if not isinstance(seq, int):
+                    records.append(record)
+                    continue
+                self._seq = max(self._seq, seq)
+                if seq > after_seq:
+                    records.append(record)
+        self._committed = self._seq
+        self._since_compact = len(records)
+        return records
+
+    def start(self, after_seq, compact_fn, compact_now=False):
+        """Открывает журнал на дозапись и запускает фоновый поток фиксации.
+
+        Без compact_fn снимки не делаются и журнал только растёт;
+        compact_now сохраняет снимок и обнуляет журнал сразу.
+        """
+        self._seq = max(self._seq, after_seq)
+        self._committed = self._seq
+        self._compact_fn = compact_fn
+        self._file = open(self._path, "ab")
+        if self._valid_size is not None:
+            self._file.truncate(self._valid_size)
+        if compact_now and compact_fn:
+            self._compact()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def append(self, record):
+        """Ставит запись в очередь на запись за O(1) и возвращает её номер."""
+        with self._cond:
+            self._seq += 1
+            record["seq"] = self._seq
+            self._pending.append(record)
+            return self._seq
+
+    def wait(self, seq):
+        """Блокирует вызывающего, пока запись seq не окажется на диске."""
+        with self._cond:
+            while self._committed < seq and not self._closed:
+                self._cond.wait()
+
+    def close(self):
+        """Сбрасывает оставшиеся записи и останавливает фоновый поток."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+        if self._file is not None:
+            self._file.close()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._pending and not self._closed:
+                    self._cond.wait(self._flush_interval)
+                batch, self._pending = self._pending, []
+                closed = self._closed
+            if batch:
+                self._flush(batch)
+            if self._since_compact >= self._compact_every and self._compact_fn:
+                self._compact()
+            if closed:
+                return
+
+    def _flush(self, batch):
+        data = b"".join(
+            json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n"
+            for record in batch
+        )
+        self._file.write(data)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._since_compact += len(batch)
+        with self._cond:
+            self._committed = batch[-1]["seq"]
+            self._cond.notify_all()
+
+    def _compact(self):
+        # Снимок включает все выданные номера, а в файле журнала лежат только
+        # уже сброшенные (не новее снимка), поэтому файл можно обнулить.
+        self._compact_fn()
+        self._file.truncate(0)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._since_compact = 0
+
+
+def write_snapshot(path, seq, items):
+    """Атомарно записывает снимок данных: временный файл, fsync и rename.
+
+    items может быть генератором: предметы сериализуются по одному, по
+    строке на предмет, и дерево объектов всего снимка в памяти не строится.
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(f'{{"seq": {int(seq)}, "subjects": [')
+        for i, item in enumerate(items):
+            f.write(",\n" if i else "\n")
+            f.write(json.dumps(item, ensure_ascii=False))
+        f.write("\n]}\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path):
+    """Читает снимок и возвращает (номер записи, список предметов).
+
+    Старый формат — просто список предметов — считается снимком с номером 0.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        return 0, data
+    return data["seq"], data["subjects"]
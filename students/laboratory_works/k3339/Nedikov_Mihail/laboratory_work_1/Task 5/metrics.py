@@ -0,0 +1,217 @@
+import bisect
+import socket
+import struct
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+
+# Границы корзин гистограмм в секундах, как принято в Prometheus.
+BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+)
+PHASES = ("request_line", "headers", "handler", "send")
+# В struct tcp_info у слушающего сокета tcpi_unacked — длина очереди
+# принятых ядром, но ещё не принятых через accept() соединений, а
+# tcpi_sacked — её предел (backlog). Оба поля — uint32 по смещению 24.
+TCP_INFO_QUEUE = struct.Struct("=24xII")
+SAMPLE_INTERVAL = 0.005  # секунд между снимками стеков профилировщика
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    body = ",".join(
+        '%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in pairs
+    )
+    return "{" + body + "}"
+
+
+class Histogram:
+    """Накопительная гистограмма длительностей с фиксированными корзинами."""
+
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # последняя корзина — +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, labels):
+        lines = []
+        seen = 0
+        for bound, count in zip((*BUCKETS, "+Inf"), self.counts):
+            seen += count
+            lines.append(f"{name}_bucket{_labels([*labels, ('le', bound)])} {seen}")
+        lines.append(f"{name}_sum{_labels(labels)} {self.sum:.9f}")
+        lines.append(f"{name}_count{_labels(labels)} {self.count}")
+        return lines
+
+
+class Metrics:
+    """Метрики одного процесса сервера в текстовом формате Prometheus.
+
+    Обновления идут из потоков и циклов asyncio, поэтому берут общую
+    блокировку; каждое — несколько операций над списком или словарём.
+    В режиме pre-fork у каждого воркера свои метрики.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._phases = {phase: Histogram() for phase in PHASES}
+        self._requests = Counter()  # (метод, маршрут, статус) -> число ответов
+        self._exceptions = Counter()  # имя класса исключения -> число
+        self._accepted = 0
+        self._open = 0
+        self._in_flight = 0
+        self._listen_sock = None
+
+    def observe(self, phase, seconds):
+        with self._lock:
+            self._phases[phase].observe(seconds)
+
+    def request_started(self):
+        with self._lock:
+            self._in_flight += 1
+
+    def request_finished(self, method, route, status, started=True):
+        """Считает ответ; started=False — запрос не дошёл до request_started."""
+        with self._lock:
+            if started:
+                self._in_flight -= 1
+            self._requests[method, route, status] += 1
+
+    def exception(self, err):
+        with self._lock:
+            self._exceptions[type(err).__name__] += 1
+
+    def connection_opened(self):
+        with self._lock:
+            self._accepted += 1
+            self._open += 1
+
+    def connection_closed(self):
+        with self._lock:
+            self._open -= 1
+
+    def watch_listener(self, sock):
+        """Запоминает слушающий сокет, чтобы показывать очередь accept."""
+        self._listen_sock = sock
+
+    def accept_queue(self):
+        """(длина, предел) очереди accept из TCP_INFO или None вне Linux."""
+        if self._listen_sock is None or not hasattr(socket, "TCP_INFO"):
+            return None
+        try:
+            info = self._listen_sock.getsockopt(
+                socket.IPPROTO_TCP, socket.TCP_INFO, TCP_INFO_QUEUE.size
+            )
+        except OSError:
+            return None
+        return TCP_INFO_QUEUE.unpack_from(info)
+
+    def render(self):
+        """Все метрики в формате text/plain; version=0.0.4."""
+        queue = self.accept_queue()
+        with self._lock:
+            out = [
+                "# HELP http_request_phase_seconds Time spent in each phase of a request.",
+                "# TYPE http_request_phase_seconds histogram",
+            ]
+            for phase, histogram in self._phases.items():
+                out += histogram.render("http_request_phase_seconds", [("phase", phase)])
+            out += [
+                "# HELP http_requests_total Responses sent, by method, route and status.",
+                "# TYPE http_requests_total counter",
+            ]
+            for (method, route, status), count in sorted(self._requests.items()):
+                labels = [("method", method), ("route", route), ("status", status)]
+                out.append(f"http_requests_total{_labels(labels)} {count}")
+            out += [
+                "# HELP http_handler_exceptions_total Unexpected exceptions turned into 500.",
+                "# TYPE http_handler_exceptions_total counter",
+            ]
+            for name, count in sorted(self._exceptions.items()):
+                out.append(f"http_handler_exceptions_total{_labels([('exception', name)])} {count}")
+            out += [
+                "# HELP http_requests_in_flight Requests being processed right now.",
+                "# TYPE http_requests_in_flight gauge",
+                f"http_requests_in_flight {self._in_flight}",
+                "# HELP http_connections_accepted_total Connections accepted.",
+                "# TYPE http_connections_accepted_total counter",
+                f"http_connections_accepted_total {self._accepted}",
+                "# HELP http_connections_open Connections currently open.",
+                "# TYPE http_connections_open gauge",
+                f"http_connections_open {self._open}",
+            ]
+        if queue is not None:
+            out += [
+                "# HELP http_accept_queue_length Connections waiting in the listen backlog.",
+                "# TYPE http_accept_queue_length gauge",
+                f"http_accept_queue_length {queue[0]}",
+                "# HELP http_accept_queue_limit Size of the listen backlog.",
+                "# TYPE http_accept_queue_limit gauge",
+                f"http_accept_queue_limit {queue[1]}",
+            ]
+        return ("\n".join(out) + "\n").encode("utf-8")
+
+
+class SlowRequestSampler:
+    """Сэмплирующий профилировщик медленных запросов (включается явно).
+
+    Обработчик отмечает начало и конец запроса в своём потоке; фоновый
+    поток каждые interval секунд снимает стеки потоков, чьи запросы идут
+    дольше threshold. Когда такой запрос завершается, в output печатаются
+    его длительность и свёрнутые стеки с числом снимков — видно, где
+    обработчик провёл время. Без медленных запросов стоимость — запись в
+    словарь на запрос и пробуждение потока раз в interval.
+    """
+
+    def __init__(self, threshold, interval=SAMPLE_INTERVAL, output=None):
+        self.threshold = threshold
+        self.interval = interval
+        self.output = output or sys.stderr
+        self._active = {}  # id потока -> [начало, описание запроса, Counter стеков]
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def start(self, description):
+        self._active[threading.get_ident()] = [time.perf_counter(), description, Counter()]
+
+    def finish(self):
+        entry = self._active.pop(threading.get_ident(), None)
+        if entry is None:
+            return
+        started, description, stacks = entry
+        elapsed = time.perf_counter() - started
+        if elapsed < self.threshold or not stacks:
+            return
+        lines = [f"slow request {description}: {elapsed * 1000:.1f} ms, "
+                 f"{sum(stacks.values())} samples"]
+        for stack, count in stacks.most_common():
+            lines.append(f"  {count} x {stack}")
+        print("\n".join(lines), file=self.output, flush=True)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            now = time.perf_counter()
+            frames = None
+            for ident, entry in list(self._active.items()):
+                if now - entry[0] < self.threshold:
+                    continue
+                if frames is None:
+                    frames = sys._current_frames()
+                frame = frames.get(ident)
+                if frame is not None:
+                    stack = traceback.extract_stack(frame)
+                    entry[2][";".join(f"{f.name} ({f.filename.rsplit('/', 1)[-1]}:{f.lineno})"
+                                      for f in stack)] += 1
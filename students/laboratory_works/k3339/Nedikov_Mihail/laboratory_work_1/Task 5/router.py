@@ -0,0 +1,86 @@
+CONVERTERS = {"str": str, "int": int}
+
+
+class Router:
+    """Таблица маршрутов, скомпилированная в словарь и префиксное дерево.
+
+    Маршруты без параметров ищутся одним обращением к словарю по пути,
+    затем по методу. Маршруты вида /grades/<int:subject_id> раскладываются по
+    сегментам в дерево, так что поиск не зависит от общего числа маршрутов.
+    Метод "*" подходит для любого метода запроса.
+    """
+
+    def __init__(self, routes=()):
+        self._static = {}  # путь -> {метод: обработчик}
+        self._tree = _Node()
+        for method, pattern, handler in routes:
+            self.add(method, pattern, handler)
+
+    def add(self, method, pattern, handler):
+        if "<" not in pattern:
+            self._static.setdefault(pattern, {})[method] = handler
+            return
+        node = self._tree
+        for segment in _split(pattern):
+            if segment.startswith("<") and segment.endswith(">"):
+                kind, _, name = segment[1:-1].rpartition(":")
+                node = node.param(name, CONVERTERS[kind or "str"])
+            else:
+                node = node.children.setdefault(segment, _Node())
+        node.handlers[method] = handler
+
+    def match(self, method, path):
+        """Возвращает (обработчик, параметры) или (None, разрешённые методы)."""
+        handlers = self._static.get(path)
+        if handlers is not None:
+            handler = handlers.get(method) or handlers.get("*")
+            if handler is not None:
+                return handler, {}
+
+        node = self._tree
+        if node.children or node.param_node is not None:
+            params = {}
+            stripped = path.strip("/")  # то же, что _split, но без вызова функции
+            for segment in stripped.split("/") if stripped else ():
+                child = node.children.get(segment)
+                if child is None:
+                    child = node.param_node
+                    if child is None:
+                        break
+                    try:
+                        params[node.param_name] = node.param_convert(segment)
+                    except ValueError:
+                        break
+                node = child
+            else:
+                handlers_here = node.handlers
+                if handlers_here:
+                    handler = handlers_here.get(method) or handlers_here.get("*")
+                    if handler is not None:
+                        return handler, params
+                    return None, set(handlers_here)
+
+        return None, set(handlers or ())
+
+
+class _Node:
+    __slots__ = ("children", "handlers", "param_name", "param_convert", "param_node")
+
+    def __init__(self):
+        self.children = {}
+        self.handlers = {}
+        self.param_name = None
+        self.param_convert = None
+        self.param_node = None
+
+    def param(self, name, convert):
+        if self.param_node is None:
+            self.param_name = name
+            self.param_convert = convert
+            self.param_node = _Node()
+        return self.param_node
+
+
+def _split(path):
+    path = path.strip("/")
+    return path.split("/") if path else []
@@ -1,90 +1,471 @@
+import asyncio
+import base64
+import gc
+import hashlib
+import io
+import multiprocessing
 import socket
 import sys
 from email.parser import Parser
-from functools import lru_cache
+from functools import cached_property
 from urllib.parse import parse_qs, urlparse
 import threading
 import json
+from concurrent.futures import ThreadPoolExecutor
 import os
+import time
+
+from grades import GradeStats, new_grades, parse_grade
+from compression import COMPRESS_MIN_SIZE, choose_encoding, compress, is_compressible
+from body import BodyError, aiter_body, body_parser, iter_body
+from journal import Journal, read_snapshot, write_snapshot
+from metrics import Metrics, SlowRequestSampler
+from router import Router
+from sortedlist import SortedList
+from store import SharedStore
 
 MAX_LINE = 64 * 1024
 MAX_HEADERS = 100
+MAX_BODY = 1024 * 1024  # байт тела запроса, больше — 413
+KEEPALIVE_TIMEOUT = 5  # секунд простоя до закрытия постоянного соединения
+MAX_KEEPALIVE_REQUESTS = 100  # запросов на одно соединение
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_FILE = os.path.join(BASE_DIR, "grades.json")
+JOURNAL_FILE = os.path.join(BASE_DIR, "grades.journal")
+STORE_FILE = os.path.join(BASE_DIR, "grades.sqlite3")  # общая база режима pre-fork
+REJECTED_FILE = os.path.join(BASE_DIR, "grades.rejected")  # негодные записи старых данных
+JOURNAL_FLUSH_INTERVAL = 0.05  # секунд между групповыми fsync журнала
+JOURNAL_COMPACT_EVERY = 1000  # записей журнала между снимками
+ENGINES = ("threads", "asyncio")
+PAGE_PARAMS = ("limit", "cursor", "title_prefix")
+PAGE_SIZE = 50  # предметов на странице GET /grades по умолчанию
+MAX_PAGE_SIZE = 1000
+EXPORT_CHUNK = 64 * 1024  # байт NDJSON в одном куске chunked-ответа
+NO_BODY_STATUSES = (204, 304)  # ответы без тела и без Content-Length (RFC 9110, 8.6)
+CLIENT_CLOSED = 499  # статус в метриках, если клиент ушёл до ответа (как в nginx)
+HANDLER_THREADS = 64  # потоков для обработчиков в движке asyncio
+INDEX_HEAD = """<html><head><title>Grades</title></head><body><h1>Добавить оценку</h1>
+        <form method="POST" action="/set_subject">
+          Дисциплина: <input type="text" name="title"><br>
+          Оценка: <input type="text" name="grade"><br>
+          <input type="submit" value="Добавить">
+        </form>
+        <hr>
+        <h2>Оценки</h2><ul>"""
+INDEX_TAIL = "</ul></body></html>"
 
 
 class MyHTTPServer:
-    def __init__(self, host, port, server_name):
-        """Сохраняет настройки сервера и загружает сохранённые данные."""
+    # Таблица маршрутов: метод ("*" — любой), шаблон пути, имя обработчика.
+    ROUTES = (
+        ("GET", "/", "handle_index"),
+        ("POST", "/set_subject", "handle_set_subject"),
+        ("GET", "/grades", "handle_get_grades"),
+        ("GET", "/grades/export", "handle_export_grades"),
+        ("GET", "/grades/stats", "handle_grade_stats"),
+        ("GET", "/grades/<int:subject_id>/stats", "handle_subject_stats"),
+        ("GET", "/metrics", "handle_metrics"),
+        ("GET", "/grades/<int:subject_id>", "handle_get_subject"),
+        ("*", "/favicon.ico", "handle_favicon"),
+    )
+
+    def __init__(
+        self,
+        host,
+        port,
+        server_name,
+        engine="threads",
+        loops=None,
+        sync_writes=False,
+        max_body=MAX_BODY,
+        store=None,
+        reuse_port=False,
+        slow_request=None,
+    ):
+        """Сохраняет настройки сервера и загружает сохранённые данные.
+
+        При sync_writes=True POST /set_subject отвечает только после того,
+        как запись попала на диск; иначе журнал пишется в фоне (write-behind).
+        Тела запросов больше max_body байт отклоняются с кодом 413.
+        С store (путь к базе SQLite) данные хранятся в общей базе вместо
+        журнала, а self._subjects — лишь её копия в памяти процесса;
+        reuse_port позволяет нескольким процессам слушать один порт.
+        slow_request (секунды) включает профилировщик: стеки обработчиков,
+        работающих дольше этого, печатаются в stderr.
+        loops — число циклов asyncio в процессе, по умолчанию один: циклы в
+        потоках одного процесса лишь делят GIL, а ядра занимает pre-fork.
+        """
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine {engine!r}, expected one of {ENGINES}")
         self._host = host
         self._port = port
+        self._reuse_port = reuse_port
         self._server_name = server_name
-        self._subjects = {}  # id -> {"id": int, "title": str, "grades": [str]}
+        self._engine = engine
+        self._max_body = max_body
+        self._router = Router(
+            (method, pattern, getattr(self, name)) for method, pattern, name in self.ROUTES
+        )
+        self._route_patterns = {name: pattern for _, pattern, name in self.ROUTES}
+        self._metrics = Metrics()
+        self._sampler = SlowRequestSampler(slow_request) if slow_request else None
+        self._loops = loops or 1
+        self._executor = None  # пул потоков обработчиков, создаёт _serve_asyncio
+        self._subjects = {}  # id -> {"id": int, "title": str, "grades": array("h")}
+        self._stats = {}  # id -> GradeStats, обновляются вместе с оценками
+        self._totals = GradeStats()  # по всем оценкам всех предметов
+        self._title_index = {}  # title -> id
+        self._sorted_titles = SortedList()  # названия по возрастанию, для страниц GET /grades
+        self._next_id = 1
+        self._version = 0  # увеличивается при каждом изменении данных
+        self._cache = {}  # имя страницы -> (версия, тело, ETag, {кодирование: тело})
         self._lock = threading.Lock()
+        self._sync_writes = sync_writes
+        self._store = None
+        self._journal = None
+        self._synced = 0  # номер последней оценки из общей базы в self._subjects
+        if store is not None:
+            self._store = SharedStore(store, sync_writes)
+        else:
+            self._journal = Journal(
+                JOURNAL_FILE, JOURNAL_FLUSH_INTERVAL, JOURNAL_COMPACT_EVERY
+            )
         self._load_data()
 
     def _load_data(self):
-        """Читает сохранённые предметы из JSON-файла на диске."""
-        if os.path.exists(DATA_FILE):
-            try:
-                with open(DATA_FILE, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                self._subjects = {item["id"]: item for item in data}
-            except (OSError, json.JSONDecodeError) as err:
-                print("Failed to load saved data:", err)
-
-    def _save_data(self):
-        """Сохраняет текущий список предметов в файл JSON."""
+        """Читает последний снимок и доигрывает поверх него записи журнала.
+
+        Если прочитать удалось не всё, снимки отключаются: новый снимок
+        затёр бы несохранённые данные. Если же негодные записи только
+        отложены в REJECTED_FILE, сразу пишется чистый снимок и обнуляется
+        журнал, чтобы они не откладывались заново при каждом запуске.
+
+        Загруженные предметы живут до конца процесса, поэтому после загрузки
+        они замораживаются (gc.freeze): иначе каждая полная сборка мусора
+        обходила бы их все, останавливая обработку запросов на сотни мс.
+        """
+        if self._store is not None:
+            self._sync()
+        else:
+            seq, records, rejected, complete = read_saved_data(self._journal)
+            for record in records:
+                self._apply(record)
+            if not complete:
+                print("Saved data was not loaded completely, snapshots are disabled")
+            self._journal.start(
+                seq, self._compact if complete else None, compact_now=complete and bool(rejected)
+            )
+        gc.collect()
+        gc.freeze()
+
+    def _apply(self, record):
+        """Применяет запись журнала к self._subjects (под self._lock)."""
+        grade = parse_grade(record["grade"])
+        subject = self._subjects.get(record["id"])
+        if subject is None:
+            subject = self._subjects[record["id"]] = {
+                "id": record["id"],
+                "title": record["title"],
+                "grades": new_grades(),
+            }
+            self._stats[record["id"]] = GradeStats()
+            self._title_index[record["title"]] = record["id"]
+            self._sorted_titles.add(record["title"])
+            self._next_id = max(self._next_id, record["id"] + 1)
+        subject["grades"].append(grade)
+        self._stats[record["id"]].add(grade)
+        self._totals.add(grade)
+        self._version += 1
+
+    def _sync(self):
+        """Догоняет общую базу: применяет оценки, записанные другими процессами.
+
+        Проверка номера последней оценки — один лёгкий запрос без
+        self._lock; копия в памяти обновляется, только если база изменилась.
+        """
+        if self._store is None or self._store.last_seq() == self._synced:
+            return
+        with self._lock:
+            for record in self._store.since(self._synced):
+                self._apply(record)
+                self._synced = record["seq"]
+
+    def _compact(self):
+        """Сохраняет снимок всех предметов, после чего журнал можно обнулить.
+
+        Как и в handle_export_grades, под блокировкой запоминаются только
+        ссылки на предметы и число их оценок: оценки лишь дописываются в
+        конец, поэтому срез до этого числа согласован с номером seq.
+        Копирование оценок, сериализация и fsync идут уже без блокировки,
+        по одному предмету: временные объекты сразу освобождаются и не
+        вызывают полную сборку мусора, которая остановила бы все потоки.
+        """
         with self._lock:
-            data = list(self._subjects.values())
-            with open(DATA_FILE, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            seq = self._journal.seq
+            subjects = list(self._subjects.values())
+            counts = [len(subject["grades"]) for subject in subjects]
+        write_snapshot(DATA_FILE, seq, (
+            dict(subject, grades=subject["grades"][:count].tolist())
+            for subject, count in zip(subjects, counts)
+        ))
+
+    def close(self):
+        """Дописывает на диск всё, что осталось в очереди журнала."""
+        if self._executor is not None:
+            self._executor.shutdown()
+        if self._store is not None:
+            self._store.close()
+        else:
+            self._journal.close()
 
     def serve_forever(self):
         """Запускает бесконечный цикл приёма и обработки подключений."""
-        serv_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM, proto=0)
+        # С IPPROTO_TCP asyncio сам включает TCP_NODELAY на принятых сокетах.
+        serv_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP)
         serv_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self._reuse_port:
+            serv_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         try:
             serv_sock.bind((self._host, self._port))
             serv_sock.listen()
-            print(f"Serving on {self._host}:{self._port} ...")
+            self._metrics.watch_listener(serv_sock)
+            print(f"Serving on {self._host}:{self._port} ({self._engine}) ...")
 
-            while True:
-                conn, _ = serv_sock.accept()
-                threading.Thread(
-                    target=self.serve_client, args=(conn,), daemon=True
-                ).start()
+            if self._engine == "asyncio":
+                self._serve_asyncio(serv_sock)
+            else:
+                self._serve_threads(serv_sock)
         finally:
             serv_sock.close()
 
+    def _serve_threads(self, serv_sock):
+        """Создаёт отдельный поток на каждое принятое соединение."""
+        while True:
+            conn, _ = serv_sock.accept()
+            threading.Thread(
+                target=self.serve_client, args=(conn,), daemon=True
+            ).start()
+
+    def _serve_asyncio(self, serv_sock):
+        """Запускает self._loops циклов asyncio поверх общего слушающего сокета.
+
+        Обработчики могут ждать fsync журнала, SQLite или self._lock, поэтому
+        они выполняются в пуле потоков, а цикл тем временем читает и пишет
+        сокеты. Все циклы и потоки делят self._subjects и синхронизируются
+        через self._lock.
+        """
+        self._executor = ThreadPoolExecutor(HANDLER_THREADS, thread_name_prefix="handler")
+        serv_sock.setblocking(False)
+        for _ in range(self._loops - 1):
+            threading.Thread(
+                target=asyncio.run, args=(self._serve_loop(serv_sock),), daemon=True
+            ).start()
+        asyncio.run(self._serve_loop(serv_sock))
+
+    async def _serve_loop(self, serv_sock):
+        """Принимает соединения в текущем цикле событий."""
+        server = await asyncio.start_server(
+            self.serve_client_async, sock=serv_sock, limit=MAX_LINE
+        )
+        async with server:
+            await server.serve_forever()
+
     def serve_client(self, conn):
-        """Обрабатывает одного клиента: парсит запрос, формирует ответ."""
+        """Обрабатывает запросы клиента, пока соединение остаётся постоянным.
+
+        Запросы читаются из одного буферизованного rfile, поэтому
+        конвейерные (pipelined) запросы обрабатываются по очереди. Пока в
+        буфере уже лежит следующий запрос, конец ответа копится в pending,
+        и ответы всей пачки уходят одним sendall.
+        """
+        conn.settimeout(KEEPALIVE_TIMEOUT)
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        rfile = conn.makefile("rb")
+        self._metrics.connection_opened()
+        req = None  # разобранный запрос, на который ещё не ответили
+        status = None
+        pending = []  # байты ответов, ещё не отправленные клиенту
         try:
-            req = self.parse_request(conn)
-            resp = self.handle_request(req)
-            self.send_response(conn, resp)
-        except ConnectionResetError:
+            for served in range(1, MAX_KEEPALIVE_REQUESTS + 1):
+                req = self.parse_request(rfile)
+                if req is None:
+                    break
+                self._metrics.request_started()
+                resp = self.handle_request(req)
+                req.drain_body()
+                keep_alive = req.keep_alive and served < MAX_KEEPALIVE_REQUESTS
+                flush = not keep_alive or not self._request_buffered(conn, rfile)
+                self.send_response(conn, resp, keep_alive, pending, flush)
+                self._request_done(req, resp.status)
+                req = None
+                if not keep_alive:
+                    break
+        except (ConnectionResetError, BrokenPipeError, socket.timeout):
             pass
         except HTTPError as err:
-            self.send_error(conn, err)
+            status = err.status
+            self.send_error(conn, err, pending)
         except Exception as err:
-            self.send_error(conn, HTTPError(500, "Internal Server Error", str(err)))
+            status = 500
+            self._metrics.exception(err)
+            self.send_error(conn, HTTPError(500, "Internal Server Error", str(err)), pending)
         finally:
+            if req is not None or status is not None:
+                self._request_done(req, status or CLIENT_CLOSED)
+            if pending:
+                # Запрос пачки оборвался на середине: готовые ответы всё равно отдаём.
+                try:
+                    conn.sendall(b"".join(pending))
+                except OSError:
+                    pass
+            rfile.close()
             conn.close()
+            self._metrics.connection_closed()
 
-    def parse_request(self, conn):
-        """Создаёт объект Request из сырых данных сокета."""
-        rfile = conn.makefile("rb")
-        method, target, ver = self.parse_request_line(rfile)
+    @staticmethod
+    def _request_buffered(conn, rfile):
+        """Лежит ли в буфере rfile заголовок следующего запроса целиком.
+
+        peek на сокете с нулевым таймаутом не ждёт данных: если их нет,
+        возвращается b"".
+        """
+        conn.settimeout(0)
+        try:
+            return head_complete(rfile.peek(MAX_LINE))
+        except OSError:
+            return False
+        finally:
+            conn.settimeout(KEEPALIVE_TIMEOUT)
+
+    async def serve_client_async(self, reader, writer):
+        """То же, что serve_client, но для неблокирующего движка asyncio."""
+        writer.get_extra_info("socket").setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._metrics.connection_opened()
+        pending = []
+        try:
+            for served in range(1, MAX_KEEPALIVE_REQUESTS + 1):
+                keep_alive = False
+                req = None
+                try:
+                    req = await self.parse_request_async(reader)
+                    if req is None:
+                        break
+                    self._metrics.request_started()
+                    resp = await asyncio.get_running_loop().run_in_executor(
+                        self._executor, self.handle_request, req
+                    )
+                    keep_alive = req.keep_alive and served < MAX_KEEPALIVE_REQUESTS
+                except HTTPError as err:
+                    resp = self.error_response(err)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError):
+                    break
+                except Exception as err:
+                    self._metrics.exception(err)
+                    resp = self.error_response(
+                        HTTPError(500, "Internal Server Error", str(err))
+                    )
+                status = CLIENT_CLOSED
+                started = time.perf_counter()
+                # У StreamReader нет открытого способа заглянуть в буфер.
+                flush = not keep_alive or not head_complete(reader._buffer)
+                try:
+                    for data in self.iter_pieces(resp, keep_alive, pending, flush):
+                        writer.write(data)
+                        await writer.drain()
+                    status = resp.status
+                finally:
+                    self._metrics.observe("send", time.perf_counter() - started)
+                    self._request_done(req, status)
+                if not keep_alive:
+                    break
+        except (ConnectionResetError, BrokenPipeError):
+            pass
+        finally:
+            if pending:
+                writer.write(b"".join(pending))
+            writer.close()
+            self._metrics.connection_closed()
+
+    def _request_done(self, req, status):
+        """Учитывает ответ в метриках; req=None — запрос не удалось разобрать."""
+        if req is None:
+            self._metrics.request_finished("-", "-", status, started=False)
+        else:
+            self._metrics.request_finished(req.method, req.route, status)
+
+    async def parse_request_async(self, reader):
+        """Дочитывает заголовки из потока и разбирает их синхронным парсером.
+
+        Возвращает None, если клиент закрыл соединение, ничего не прислав.
+        На ожидание запроса и чтение заголовков отводится KEEPALIVE_TIMEOUT;
+        тело ограничено только простоем между кусками, чтобы медленная
+        загрузка не обрывалась.
+        """
+        head = await asyncio.wait_for(self.read_head_async(reader), KEEPALIVE_TIMEOUT)
+        if head is None:
+            return None
+        request_line = self.parse_request_line(head)
+        if request_line is None:
+            return None
+        method, target, ver = request_line
+        headers = self.parse_headers(head)
+        if not headers.get("Host"):
+            raise HTTPError(400, "Bad Request", "Host header required")
+
+        # Тело разбирается по мере поступления, поэтому в памяти остаётся
+        # только результат разбора, а не весь поток байтов.
+        parser = body_parser(headers.get("Content-Type"))
+        try:
+            async for chunk in aiter_body(reader, headers, self._max_body, KEEPALIVE_TIMEOUT):
+                if parser is not None:
+                    parser.feed(chunk)
+            form = parser.close() if parser is not None else {}
+        except BodyError as err:
+            raise HTTPError(err.status, err.reason, str(err))
+        except ValueError:
+            raise HTTPError(400, "Bad Request", "Malformed chunked body")
+        return Request(method, target, ver, headers, io.BytesIO(), form=form)
+
+    async def read_head_async(self, reader):
+        """Читает строку запроса и заголовки; None — соединение закрыто."""
+        lines = []
+        while len(lines) <= MAX_HEADERS + 1:
+            try:
+                line = await reader.readline()
+            except ValueError:
+                if not lines:
+                    raise HTTPError(414, "Request URI Too Long", "Request line is too long")
+                raise HTTPError(431, "Request Header Fields Too Large", "Header line is too long")
+            if not line and not lines:
+                return None
+            lines.append(line)
+            if line in (b"\r\n", b"\n", b"") and len(lines) > 1:
+                break
+        return io.BytesIO(b"".join(lines))
+
+    def parse_request(self, rfile):
+        """Создаёт объект Request из данных, прочитанных из файла сокета.
+
+        Возвращает None, если клиент закрыл соединение между запросами.
+        """
+        request_line = self.parse_request_line(rfile)
+        if request_line is None:
+            return None
+        method, target, ver = request_line
         headers = self.parse_headers(rfile)
         host = headers.get("Host")
         if not host:
             raise HTTPError(400, "Bad Request", "Host header required")
-        return Request(method, target, ver, headers, rfile)
+        return Request(method, target, ver, headers, rfile, self._max_body)
 
     def parse_request_line(self, rfile):
         """Читает первую строку HTTP-запроса и разбивает её на части."""
         raw = rfile.readline(MAX_LINE + 1)
+        if not raw:
+            return None
+        # Отсчёт после чтения строки: ожидание следующего запроса на
+        # keep-alive соединении — простой, а не работа сервера.
+        started = time.perf_counter()
         if len(raw) > MAX_LINE:
             raise HTTPError(414, "Request URI Too Long", "Request line is too long")
         req_line = str(raw, "iso-8859-1").rstrip("\r\n")
@@ -94,10 +475,12 @@ class MyHTTPServer:
         method, target, ver = words
         if ver != "HTTP/1.1":
             raise HTTPError(505, "HTTP Version Not Supported", "Unexpected HTTP version")
+        self._metrics.observe("request_line", time.perf_counter() - started)
         return method, target, ver
 
     def parse_headers(self, rfile):
         """Собирает заголовки HTTP-запроса в объект email.message."""
+        started = time.perf_counter()
         headers = []
         while True:
             line = rfile.readline(MAX_LINE + 1)
@@ -109,136 +492,396 @@ class MyHTTPServer:
             if len(headers) > MAX_HEADERS:
                 raise HTTPError(431, "Request Header Fields Too Large", "Too many headers")
         sheaders = b"".join(headers).decode("iso-8859-1")
-        return Parser().parsestr(sheaders)
+        parsed = Parser().parsestr(sheaders)
+        self._metrics.observe("headers", time.perf_counter() - started)
+        return parsed
 
     def handle_request(self, req):
         """Маршрутизирует запрос к нужному обработчику."""
-        if req.path == "/" and req.method == "GET":
-            return self.handle_index(req)
-        if req.path == "/set_subject" and req.method == "POST":
-            return self.handle_set_subject(req)
-        if req.path == "/grades" and req.method == "GET":
-            return self.handle_get_grades(req)
-        if req.path == "/favicon.ico":
-            return Response(
-                204, "No Content", [("Content-Length", "0"), ("Connection", "close")]
-            )
-        raise HTTPError(404, "Not Found", f"No route for {req.method} {req.path}")
+        handler, params = self._router.match(req.method, req.path)
+        if handler is None:
+            if params:
+                allow = ", ".join(sorted(params))
+                raise HTTPError(
+                    405, "Method Not Allowed", f"{req.method} is not allowed for {req.path}",
+                    headers=[("Allow", allow)],
+                )
+            raise HTTPError(404, "Not Found", f"No route for {req.method} {req.path}")
+        req.params = params
+        req.route = self._route_patterns[handler.__name__]
+        started = time.perf_counter()
+        if self._sampler is not None:
+            self._sampler.start(f"{req.method} {req.target}")
+        try:
+            return self.compress_response(req, handler(req))
+        finally:
+            if self._sampler is not None:
+                self._sampler.finish()
+            self._metrics.observe("handler", time.perf_counter() - started)
 
-    def handle_index(self, req):
-        """Отдаёт HTML-страницу с формой и списком оценок."""
-        body = "<html><head><title>Grades</title></head><body>"
-        body += "<h1>Добавить оценку</h1>"
-        body += """
-        <form method="POST" action="/set_subject">
-          Дисциплина: <input type="text" name="title"><br>
-          Оценка: <input type="text" name="grade"><br>
-          <input type="submit" value="Добавить">
-        </form>
-        <hr>
-        """
-        body += "<h2>Оценки</h2><ul>"
-        with self._lock:
-            for subj in self._subjects.values():
-                grades_str = ", ".join(subj["grades"])
-                body += f"<li>{subj['title']}: {grades_str}</li>"
-        body += "</ul></body></html>"
+    def compress_response(self, req, resp):
+        """Сжимает на лету крупные текстовые ответы, если клиент это принимает."""
+        if not isinstance(resp.body, bytes) or len(resp.body) < COMPRESS_MIN_SIZE:
+            return resp
+        headers = resp.headers or []
+        names = {k.lower(): v for k, v in headers}
+        if "content-encoding" in names or not is_compressible(names.get("content-type")):
+            return resp
+        encoding = choose_encoding(req.headers.get("Accept-Encoding"))
+        if encoding is None:
+            return resp
+        body = compress(resp.body, encoding)
+        headers = [(k, v) for k, v in headers if k.lower() != "content-length"]
+        headers += [("Content-Encoding", encoding), ("Vary", "Accept-Encoding")]
+        return Response(resp.status, resp.reason, headers, body)
 
-        body = body.encode("utf-8")
+    def handle_metrics(self, req):
+        """Метрики этого процесса в текстовом формате Prometheus."""
+        body = self._metrics.render()
         headers = [
-            ("Content-Type", "text/html; charset=utf-8"),
+            ("Content-Type", "text/plain; version=0.0.4; charset=utf-8"),
             ("Content-Length", str(len(body))),
-            ("Connection", "close"),
         ]
         return Response(200, "OK", headers, body)
 
+    def handle_favicon(self, req):
+        """Иконки нет, отвечаем пустым ответом."""
+        return Response(204, "No Content")
+
+    def handle_index(self, req):
+        """Отдаёт HTML-страницу с формой и списком оценок."""
+        return self._cached_response(
+            req, "index", self._render_index, "text/html; charset=utf-8"
+        )
+
+    def _render_index(self):
+        """Собирает HTML-страницу целиком (вызывается под self._lock)."""
+        items = [
+            f"<li>{subj['title']}: {', '.join(map(str, subj['grades']))}</li>"
+            for subj in self._subjects.values()
+        ]
+        return "".join([INDEX_HEAD, *items, INDEX_TAIL]).encode("utf-8")
+
     def handle_set_subject(self, req):
         """Принимает данные формы и обновляет список предметов."""
         q = req.query
 
-        # Если параметры пустые — читаем тело формы
+        # Если параметры пустые — читаем тело формы (urlencoded или JSON)
         if req.method == "POST" and not q:
-            ctype = req.headers.get("Content-Type", "")
-            if "application/x-www-form-urlencoded" in ctype:
-                length = int(req.headers.get("Content-Length", 0))
-                body = req.rfile.read(length).decode("utf-8")
-                q = parse_qs(body)
+            q = req.form()
 
         try:
             title = q["title"][0]
             grade = q["grade"][0]
         except (KeyError, IndexError):
             raise HTTPError(400, "Bad Request", "title and grade are required")
+        try:
+            grade = parse_grade(grade)
+        except ValueError as err:
+            raise HTTPError(400, "Bad Request", str(err))
+
+        if self._store is not None:
+            # Запись зафиксирована в базе до ответа, поэтому любой следующий
+            # запрос в любом процессе её увидит.
+            self._store.add(title, grade)
+            self._sync()
+            return Response(303, "See Other", headers=[("Location", "/"), ("Content-Length", "0")])
 
         with self._lock:
-            existing = next(
-                (s for s in self._subjects.values() if s["title"] == title), None
-            )
-            if existing:
-                existing["grades"].append(grade)
-                subject_id = existing["id"]
-            else:
-                subject_id = (max(self._subjects.keys()) + 1) if self._subjects else 1
-                self._subjects[subject_id] = {
-                    "id": subject_id,
-                    "title": title,
-                    "grades": [grade],
-                }
+            subject_id = self._title_index.get(title)
+            if subject_id is None:
+                subject_id = self._next_id
+            record = {"id": subject_id, "title": title, "grade": grade}
+            self._apply(record)
+            seq = self._journal.append(record)
 
-        self._save_data()
+        if self._sync_writes:
+            self._journal.wait(seq)
 
         headers = [
             ("Location", "/"),
             ("Content-Length", "0"),
-            ("Connection", "close"),
         ]
         return Response(303, "See Other", headers=headers)
 
     def handle_get_grades(self, req):
-        """Возвращает список предметов в формате JSON."""
+        """Возвращает список предметов в формате JSON.
+
+        Без параметров — весь список из кэша; с limit, cursor или
+        title_prefix — одна страница предметов в порядке названий.
+        """
+        if not any(name in req.query for name in PAGE_PARAMS):
+            return self._cached_response(
+                req, "grades", self._render_grades, "application/json; charset=utf-8"
+            )
+        return self._grades_page(req.query)
+
+    def _grades_page(self, q):
+        """Страница предметов по отсортированному индексу названий за O(log n + k).
+
+        cursor — закодированное название последнего предмета предыдущей
+        страницы, поэтому страницы не сдвигаются при добавлении предметов.
+        Под блокировкой копируются только k предметов страницы.
+        """
+        try:
+            limit = int(q.get("limit", [PAGE_SIZE])[0])
+        except ValueError:
+            raise HTTPError(400, "Bad Request", "limit must be an integer")
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            raise HTTPError(400, "Bad Request", f"limit must be between 1 and {MAX_PAGE_SIZE}")
+        prefix = q.get("title_prefix", [""])[0]
+        after = None
+        if "cursor" in q:
+            after = decode_cursor(q["cursor"][0])
+
+        self._sync()
+        start, inclusive = prefix, True
+        if after is not None and after >= prefix:
+            start, inclusive = after, False
+        with self._lock:
+            items = []
+            more = False
+            for title in self._sorted_titles.irange(start, inclusive):
+                if not title.startswith(prefix):
+                    break
+                if len(items) == limit:
+                    more = True
+                    break
+                subject = self._subjects[self._title_index[title]]
+                items.append(dict(subject, grades=subject["grades"].tolist()))
+        page = {"items": items, "next_cursor": encode_cursor(items[-1]["title"]) if more else None}
+        body = json.dumps(page, ensure_ascii=False).encode("utf-8")
+        headers = [
+            ("Content-Type", "application/json; charset=utf-8"),
+            ("Content-Length", str(len(body))),
+        ]
+        return Response(200, "OK", headers, body)
+
+    def handle_export_grades(self, req):
+        """Отдаёт все предметы потоком NDJSON: по одному JSON-объекту в строке.
+
+        Под блокировкой запоминаются только ссылки на предметы и число их
+        оценок; оценки лишь дописываются в конец, поэтому срез до этого
+        числа даёт согласованный снимок, а сериализация идёт без блокировки
+        по мере отправки.
+        """
+        self._sync()
+        with self._lock:
+            snapshot = [(subject, len(subject["grades"])) for subject in self._subjects.values()]
+        headers = [("Content-Type", "application/x-ndjson; charset=utf-8")]
+        return Response(200, "OK", headers, self._iter_export(snapshot))
+
+    def _iter_export(self, snapshot):
+        chunk = []
+        size = 0
+        for subject, count in snapshot:
+            line = json.dumps(
+                dict(subject, grades=subject["grades"][:count].tolist()), ensure_ascii=False
+            ).encode("utf-8") + b"\n"
+            chunk.append(line)
+            size += len(line)
+            if size >= EXPORT_CHUNK:
+                yield b"".join(chunk)
+                chunk, size = [], 0
+        if chunk:
+            yield b"".join(chunk)
+
+    def _render_grades(self):
+        """Сериализует все предметы в JSON (вызывается под self._lock)."""
+        data = [dict(s, grades=s["grades"].tolist()) for s in self._subjects.values()]
+        return json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+
+    def handle_grade_stats(self, req):
+        """Агрегаты оценок по каждому предмету и по всем сразу, из кэша."""
+        return self._cached_response(
+            req, "stats", self._render_stats, "application/json; charset=utf-8"
+        )
+
+    def _render_stats(self):
+        """Собирает готовые агрегаты без пересчёта оценок (под self._lock)."""
+        data = {
+            "subjects": [
+                {"id": s["id"], "title": s["title"], **self._stats[s["id"]].as_dict()}
+                for s in self._subjects.values()
+            ],
+            "total": self._totals.as_dict(),
+        }
+        return json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+
+    def handle_subject_stats(self, req):
+        """Агрегаты оценок одного предмета из /grades/<id>/stats за O(1)."""
+        self._sync()
+        subject_id = req.params["subject_id"]
         with self._lock:
-            data = list(self._subjects.values())
+            subject = self._subjects.get(subject_id)
+            if subject is None:
+                raise HTTPError(404, "Not Found", "No such subject")
+            data = {"id": subject_id, "title": subject["title"], **self._stats[subject_id].as_dict()}
         body = json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
         headers = [
             ("Content-Type", "application/json; charset=utf-8"),
             ("Content-Length", str(len(body))),
-            ("Connection", "close"),
         ]
         return Response(200, "OK", headers, body)
 
-    def send_response(self, conn, resp):
-        """Формирует HTTP-ответ и отправляет его клиенту."""
-        wfile = conn.makefile("wb")
-        status_line = f"HTTP/1.1 {resp.status} {resp.reason}\r\n"
-        wfile.write(status_line.encode("iso-8859-1"))
+    def _cached(self, name, render, encoding=None):
+        """Возвращает (тело, ETag, кодирование), перестраивая их только после записи.
 
-        headers = resp.headers or []
+        Пока версия данных не изменилась, чтение не берёт блокировку и ничего
+        не сериализует: отдаются заранее закодированные байты. Сжатый вариант
+        строится при первом запросе с нужным Accept-Encoding и живёт до
+        следующей записи вместе с исходным телом.
+        """
+        self._sync()
+        entry = self._cache.get(name)
+        if entry is None or entry[0] != self._version:
+            with self._lock:
+                entry = self._cache.get(name)
+                if entry is None or entry[0] != self._version:
+                    body = render()
+                    etag = '"%s"' % hashlib.md5(body, usedforsecurity=False).hexdigest()
+                    entry = (self._version, body, etag, {})
+                    self._cache[name] = entry
+        _, body, etag, variants = entry
+        if encoding is None or len(body) < COMPRESS_MIN_SIZE:
+            return body, etag, None
+        encoded = variants.get(encoding)
+        if encoded is None:
+            encoded = variants[encoding] = compress(body, encoding)
+        return encoded, f'{etag[:-1]}-{encoding}"', encoding
+
+    def _cached_response(self, req, name, render, content_type):
+        """Отвечает 304, если у клиента актуальная копия, иначе 200 из кэша."""
+        encoding = choose_encoding(req.headers.get("Accept-Encoding"))
+        body, etag, encoding = self._cached(name, render, encoding)
+        if etag_matches(req.headers.get("If-None-Match"), etag):
+            return Response(304, "Not Modified", [("ETag", etag), ("Vary", "Accept-Encoding")])
+        headers = [
+            ("Content-Type", content_type),
+            ("Content-Length", str(len(body))),
+            ("ETag", etag),
+            ("Cache-Control", "no-cache"),
+            ("Vary", "Accept-Encoding"),
+        ]
+        if encoding is not None:
+            headers.append(("Content-Encoding", encoding))
+        return Response(200, "OK", headers, body)
+
+    def handle_get_subject(self, req):
+        """Возвращает один предмет по id из пути /grades/<id>."""
+        self._sync()
+        with self._lock:
+            subject = self._subjects.get(req.params["subject_id"])
+            if subject is None:
+                raise HTTPError(404, "Not Found", "No such subject")
+            data = dict(subject, grades=subject["grades"].tolist())
+            body = json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+        headers = [
+            ("Content-Type", "application/json; charset=utf-8"),
+            ("Content-Length", str(len(body))),
+        ]
+        return Response(200, "OK", headers, body)
+
+    def send_response(self, conn, resp, keep_alive=False, pending=None, flush=True):
+        """Формирует HTTP-ответ и отправляет его клиенту.
+
+        pending и flush — как у iter_pieces.
+        """
+        started = time.perf_counter()
+        try:
+            for data in self.iter_pieces(resp, keep_alive, pending, flush):
+                conn.sendall(data)
+        finally:
+            self._metrics.observe("send", time.perf_counter() - started)
+
+    def iter_pieces(self, resp, keep_alive=False, pending=None, flush=True):
+        """Байты ответа для отправки с учётом отложенных ответов.
+
+        pending — список байтов предыдущих ответов, ещё не ушедших клиенту:
+        они отправляются вместе с первой частью этого ответа. При flush=False
+        последняя часть не отдаётся, а остаётся в pending до следующего
+        ответа, так что ответы на конвейерные запросы уходят одной записью.
+        """
+        if pending is None:
+            pending = []
+        pieces = self.iter_response(resp, keep_alive)
+        pending.append(next(pieces))
+        for data in pieces:
+            yield b"".join(pending)
+            pending.clear()
+            pending.append(data)
+        if flush:
+            yield b"".join(pending)
+            pending.clear()
+
+    def iter_response(self, resp, keep_alive=False):
+        """Байты ответа по частям: тело-итератор уходит кусками chunked.
+
+        Заголовок склеивается с первым куском, а завершающий нулевой кусок —
+        с последним, чтобы короткая выгрузка не дробилась на мелкие записи.
+        """
+        head = self.encode_response(resp, keep_alive)
+        if isinstance(resp.body, (bytes, type(None))):
+            yield head
+            return
+        chunks = (b"%x\r\n%s\r\n" % (len(chunk), chunk) for chunk in resp.body if chunk)
+        data = head + next(chunks, b"")
+        for chunk in chunks:
+            yield data
+            data = chunk
+        yield data + b"0\r\n\r\n"
+
+    def encode_response(self, resp, keep_alive=False):
+        """Собирает статус, заголовки и тело ответа в одну строку байтов.
+
+        Если тело — итератор кусков, возвращается только заголовок с
+        Transfer-Encoding: chunked, а тело отправляет iter_response.
+        У 204 и 304 тела нет, и Content-Length не отправляется.
+        """
+        lines = [f"HTTP/1.1 {resp.status} {resp.reason}\r\n"]
+
+        headers = list(resp.headers or [])
+        if resp.status in NO_BODY_STATUSES:
+            headers = [(k, v) for k, v in headers if k.lower() != "content-length"]
+            resp = Response(resp.status, resp.reason, headers)
         has_len = any(k.lower() == "content-length" for k, _ in headers)
         has_conn = any(k.lower() == "connection" for k, _ in headers)
+        streamed = not isinstance(resp.body, (bytes, type(None)))
 
-        if resp.body is not None and not has_len:
+        if streamed:
+            headers.append(("Transfer-Encoding", "chunked"))
+        elif resp.body is not None and not has_len:
             headers.append(("Content-Length", str(len(resp.body))))
-        if resp.body is None and not has_len:
+        if resp.body is None and not has_len and resp.status not in NO_BODY_STATUSES:
             headers.append(("Content-Length", "0"))
-        if not has_conn:
+        if not has_conn and keep_alive:
+            headers.append(("Connection", "keep-alive"))
+            headers.append(
+                ("Keep-Alive", f"timeout={KEEPALIVE_TIMEOUT}, max={MAX_KEEPALIVE_REQUESTS}")
+            )
+        elif not has_conn:
             headers.append(("Connection", "close"))
 
         for k, v in headers:
-            wfile.write(f"{k}: {v}\r\n".encode("iso-8859-1"))
+            lines.append(f"{k}: {v}\r\n")
+        lines.append("\r\n")
 
-        wfile.write(b"\r\n")
-        if resp.body is not None:
-            wfile.write(resp.body)
+        head = "".join(lines).encode("iso-8859-1")
+        if resp.body is not None and not streamed:
+            return head + resp.body
+        return head
 
-        wfile.flush()
-        wfile.close()
+    def send_error(self, conn, err, pending=None):
+        """Отправляет клиенту ответ с ошибкой вслед за отложенными ответами."""
+        self.send_response(conn, self.error_response(err), pending=pending)
 
-    def send_error(self, conn, err):
+    def error_response(self, err):
         """Создаёт ответ с ошибкой, если обработка запроса завершилась исключением."""
         try:
             status = getattr(err, "status", 500)
             reason = getattr(err, "reason", "Internal Server Error")
             body_raw = getattr(err, "body", None)
+            extra_headers = getattr(err, "headers", None) or []
 
             if body_raw is None:
                 body_raw = reason
@@ -251,36 +894,109 @@ class MyHTTPServer:
             status = 500
             reason = "Internal Server Error"
             body = b"Internal Server Error"
+            extra_headers = []
 
         headers = [
             ("Content-Type", "text/plain; charset=utf-8"),
             ("Content-Length", str(len(body))),
             ("Connection", "close"),
+            *extra_headers,
         ]
-        resp = Response(status, reason, headers, body)
-        self.send_response(conn, resp)
+        return Response(status, reason, headers, body)
+
+
+def head_complete(data):
+    """Есть ли в уже полученных байтах заголовок запроса целиком."""
+    return b"\n\r\n" in data or b"\n\n" in data
+
+
+def encode_cursor(title):
+    """Непрозрачный курсор страницы: название в base64url без "="."""
+    return base64.urlsafe_b64encode(title.encode("utf-8")).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.b64decode(cursor + "=" * (-len(cursor) % 4), altchars=b"-_", validate=True)
+        return raw.decode("utf-8")
+    except ValueError:
+        raise HTTPError(400, "Bad Request", "Malformed cursor")
+
+
+def etag_matches(if_none_match, etag):
+    """Проверяет заголовок If-None-Match (список ETag через запятую или *)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in tags)
 
 
 class Request:
     """Обёртка над данными HTTP-запроса с удобными свойствами."""
-    def __init__(self, method, target, version, headers, rfile):
+    def __init__(self, method, target, version, headers, rfile, max_body=MAX_BODY, form=None):
         self.method = method
         self.target = target
         self.version = version
         self.headers = headers
         self.rfile = rfile
+        self.max_body = max_body
+        self.params = {}  # параметры пути, заполняет маршрутизатор
+        self.route = "-"  # шаблон маршрута для метрик; "-" — маршрут не найден
+        self._form = form
+        self._body_consumed = form is not None
+
+    @property
+    def keep_alive(self):
+        """В HTTP/1.1 соединение постоянное, пока клиент не попросит закрыть его."""
+        return self.headers.get("Connection", "").lower() != "close"
+
+    def iter_body(self):
+        """Отдаёт тело запроса кусками; прочитать его можно только один раз."""
+        if self._body_consumed:
+            return
+        self._body_consumed = True
+        try:
+            yield from iter_body(self.rfile, self.headers, self.max_body)
+        except BodyError as err:
+            raise HTTPError(err.status, err.reason, str(err))
+
+    def read_body(self):
+        """Читает тело запроса целиком (не больше max_body байт)."""
+        return b"".join(self.iter_body())
+
+    def drain_body(self):
+        """Пропускает непрочитанное тело, чтобы следующий запрос начался верно."""
+        for _ in self.iter_body():
+            pass
+
+    def form(self):
+        """Разбирает тело urlencoded-формы или JSON-объекта по мере чтения."""
+        if self._form is None:
+            parser = body_parser(self.headers.get("Content-Type"))
+            if parser is None:
+                self._form = {}
+            else:
+                try:
+                    for chunk in self.iter_body():
+                        parser.feed(chunk)
+                    self._form = parser.close()
+                except BodyError as err:
+                    raise HTTPError(err.status, err.reason, str(err))
+        return self._form
 
     @property
     def path(self):
         return self.url.path
 
-    @property
-    @lru_cache(maxsize=None)
+    # cached_property хранит результат в самом объекте, поэтому он
+    # освобождается вместе с запросом (lru_cache на методе держал бы его вечно).
+    @cached_property
     def query(self):
         return parse_qs(self.url.query)
 
-    @property
-    @lru_cache(maxsize=None)
+    @cached_property
     def url(self):
         return urlparse(self.target)
 
@@ -296,19 +1012,208 @@ class Response:
 
 class HTTPError(Exception):
     """Исключение для передачи HTTP-статуса и текста ошибки клиенту."""
-    def __init__(self, status, reason, body=None):
+    def __init__(self, status, reason, body=None, headers=None):
         super().__init__(reason)
         self.status = status
         self.reason = reason
         self.body = body
+        self.headers = headers
 
 
-if __name__ == "__main__":
-    host = sys.argv[1]
-    port = int(sys.argv[2])
-    name = sys.argv[3]
-    serv = MyHTTPServer(host, port, name)
+def read_saved_data(journal):
+    """Читает снимок и записи журнала после него; ничего не применяет.
+
+    Возвращает (seq, records, rejected, complete). Все записи проверяются
+    заранее: старые данные могут хранить оценки строками вроде "5+" или
+    "отлично". Каждая негодная запись печатается и дописывается в
+    REJECTED_FILE, а остальные загружаются. complete ложно, если снимок не
+    прочитан или негодные записи не удалось отложить.
+    """
+    seq, raw, rejected = 0, [], []
+    complete = True
+
+    def reject(record, error):
+        print(f"Skipping bad saved record {record!r}: {error}")
+        rejected.append({"record": record, "error": str(error)})
+
+    if os.path.exists(DATA_FILE):
+        try:
+            seq, data = read_snapshot(DATA_FILE)
+            if not isinstance(seq, int) or not isinstance(data, list):
+                raise ValueError("malformed snapshot")
+        except (OSError, ValueError, KeyError, TypeError) as err:
+            print("Failed to load saved data:", err)
+            seq, data = 0, []
+            complete = False
+        for item in data:
+            if not isinstance(item, dict) or not isinstance(item.get("grades"), list):
+                reject(item, "subject must be an object with a list of grades")
+                continue
+            raw += [
+                {"id": item.get("id"), "title": item.get("title"), "grade": grade}
+                for grade in item["grades"]
+            ]
+    for record in journal.replay(seq):
+        if isinstance(record, dict) and isinstance(record.get("seq"), int):
+            raw.append(record)
+        else:
+            reject(record, "journal record without seq")
+
+    records = []
+    for record in raw:
+        try:
+            if not isinstance(record.get("id"), int) or not isinstance(record.get("title"), str):
+                raise ValueError("id must be an integer and title a string")
+            records.append(dict(record, grade=parse_grade(record.get("grade"))))
+        except ValueError as err:
+            reject(record, err)
+    if rejected:
+        try:
+            with open(REJECTED_FILE, "a", encoding="utf-8") as f:
+                for entry in rejected:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError as err:
+            print("Failed to save rejected records:", err)
+            complete = False
+    return seq, records, rejected, complete
+
+
+def saved_seq():
+    """Номер последней записи в снимке и журнале; None, если снимок не читается."""
+    seq = 0
+    if os.path.exists(DATA_FILE):
+        try:
+            seq, _ = read_snapshot(DATA_FILE)
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        if not isinstance(seq, int):
+            return None
+    journal = Journal(JOURNAL_FILE)
+    journal.replay(seq)
+    return max(seq, journal.seq)
+
+
+def hand_over(store_path, mode):
+    """Передаёт данные режиму mode ("prefork" или "single") перед запуском.
+
+    Одиночный режим хранит оценки в снимке и журнале, pre-fork — в общей
+    базе SQLite. Режимы не работают одновременно, а при старте забирают
+    изменения, сделанные другим. В базе хранятся номера последних записей
+    обеих сторон на момент прошлой передачи. Если с тех пор писали только в
+    одну сторону, её данные целиком переносятся в другую. Если в обе и
+    данные разошлись, запуск отказывается: иначе одна из сторон потеряла
+    бы оценки.
+    """
+    journal_seq = saved_seq()
+    store = SharedStore(store_path)
+    try:
+        store_seq = store.last_seq()
+        handoff = store.handoff()
+        if handoff is None:
+            # Передач ещё не было: у старого снимка-списка номер 0, как у пустой базы.
+            last_journal_seq, last_store_seq = None, 0
+        else:
+            last_journal_seq, last_store_seq = handoff
+        journal_changed = journal_seq != last_journal_seq
+        store_changed = store_seq != last_store_seq
+        if journal_changed and (store_changed or mode == "prefork"):
+            _, records, _, complete = read_saved_data(Journal(JOURNAL_FILE))
+            if not complete:
+                # Перенос или сравнение без части данных потеряли бы её.
+                raise RuntimeError(f"Saved data in {DATA_FILE} could not be read completely")
+            subjects = {}
+            for record in records:
+                subject = subjects.setdefault(
+                    record["id"], {"id": record["id"], "title": record["title"], "grades": []}
+                )
+                subject["grades"].append(record["grade"])
+            subjects = sorted(subjects.values(), key=lambda subject: subject["id"])
+            if not store_changed:
+                store.replace_subjects(subjects, journal_seq)
+            elif subjects == store.subjects():
+                store.set_handoff(journal_seq)  # прошлая передача прервалась после записи данных
+            else:
+                raise RuntimeError(
+                    f"Both {DATA_FILE} and {store_path} changed since the last switch between"
+                    " single and pre-fork modes; keep one of them and remove the other"
+                )
+        elif store_changed and mode == "single":
+            # Номер снимка больше всех записей журнала, поэтому они не доигрываются.
+            journal_seq += store_seq - last_store_seq
+            write_snapshot(DATA_FILE, journal_seq, store.subjects())
+            open(JOURNAL_FILE, "wb").close()
+            store.set_handoff(journal_seq)
+    finally:
+        store.close()
+
+
+def run_worker(host, port, name, engine, sync_writes, store_path, slow_request=None):
+    """Процесс-воркер pre-fork: свой сокет на общем порту и один цикл событий."""
+    serv = MyHTTPServer(
+        host, port, name, engine=engine, loops=1, sync_writes=sync_writes,
+        store=store_path, reuse_port=True, slow_request=slow_request,
+    )
     try:
         serv.serve_forever()
     except KeyboardInterrupt:
         pass
+    finally:
+        serv.close()
+
+
+def serve_prefork(host, port, name, workers, engine="threads", sync_writes=False,
+                  store_path=STORE_FILE, slow_request=None):
+    """Запускает workers процессов на одном порту через SO_REUSEPORT.
+
+    Ядро распределяет соединения между воркерами, а данные они делят через
+    общую базу SQLite. Перед запуском в неё переносятся изменения, сделанные
+    в одиночном режиме (см. hand_over).
+    """
+    hand_over(store_path, "prefork")
+    procs = [
+        multiprocessing.Process(
+            target=run_worker,
+            args=(host, port, name, engine, sync_writes, store_path, slow_request),
+        )
+        for _ in range(workers)
+    ]
+    for proc in procs:
+        proc.start()
+    try:
+        for proc in procs:
+            proc.join()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    # python server.py host port name [engine] [воркеры] [--slow мс];
+    # воркеров больше одного — режим pre-fork с общей базой, --slow
+    # печатает стеки обработчиков, работающих дольше заданного. Режимы не
+    # запускаются одновременно на одних данных: при старте каждый забирает
+    # изменения, сделанные другим (hand_over).
+    args = sys.argv[1:]
+    slow_request = None
+    if "--slow" in args:
+        i = args.index("--slow")
+        slow_request = float(args[i + 1]) / 1000
+        del args[i:i + 2]
+    host = args[0]
+    port = int(args[1])
+    name = args[2]
+    engine = args[3] if len(args) > 3 else "threads"
+    workers = int(args[4]) if len(args) > 4 else 1
+    if workers > 1:
+        serve_prefork(host, port, name, workers, engine, slow_request=slow_request)
+    else:
+        if os.path.exists(STORE_FILE):
+            hand_over(STORE_FILE, "single")
+        serv = MyHTTPServer(host, port, name, engine=engine, slow_request=slow_request)
+        try:
+            serv.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            serv.close()
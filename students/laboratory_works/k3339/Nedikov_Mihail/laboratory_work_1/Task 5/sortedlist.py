@@ -0,0 +1,59 @@
+from bisect import bisect_left, bisect_right, insort
+
+CHUNK_SIZE = 1000  # половина наибольшего размера куска
+
+
+class SortedList:
+    """Отсортированный список строк, разбитый на куски по CHUNK_SIZE.
+
+    Вставка в один плоский список сдвигает в среднем n/2 ссылок, и при
+    миллионе элементов это сотни микросекунд. Здесь кусок находится
+    бинарным поиском по максимумам кусков, и сдвигаются только ссылки
+    внутри куска; кусок длиннее 2 * CHUNK_SIZE делится пополам. Так вставка
+    стоит O(log n + CHUNK_SIZE) независимо от размера списка.
+    """
+
+    def __init__(self, chunk_size=CHUNK_SIZE):
+        self._chunk_size = chunk_size
+        self._chunks = []  # непустые отсортированные куски
+        self._maxes = []  # последний элемент каждого куска
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            yield from chunk
+
+    def add(self, value):
+        """Вставляет значение, сохраняя порядок."""
+        self._len += 1
+        if not self._chunks:
+            self._chunks.append([value])
+            self._maxes.append(value)
+            return
+        i = bisect_left(self._maxes, value)
+        if i == len(self._chunks):
+            i -= 1
+            self._chunks[i].append(value)
+            self._maxes[i] = value
+        else:
+            insort(self._chunks[i], value)
+        chunk = self._chunks[i]
+        if len(chunk) > 2 * self._chunk_size:
+            half = chunk[self._chunk_size:]
+            del chunk[self._chunk_size:]
+            self._chunks.insert(i + 1, half)
+            self._maxes[i] = chunk[-1]
+            self._maxes.insert(i + 1, half[-1])
+
+    def irange(self, start, inclusive=True):
+        """Значения от start (или строго после него) по возрастанию."""
+        find = bisect_left if inclusive else bisect_right
+        i = find(self._maxes, start)
+        if i == len(self._chunks):
+            return
+        yield from self._chunks[i][find(self._chunks[i], start):]
+        for j in range(i + 1, len(self._chunks)):
+            yield from self._chunks[j]
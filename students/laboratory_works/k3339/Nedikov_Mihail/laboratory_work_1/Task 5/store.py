@@ -0,0 +1,144 @@
+import sqlite3
+import threading
+
+
+class SharedStore:
+    """Оценки в общей базе SQLite в режиме WAL для нескольких процессов.
+
+    Каждая оценка — строка таблицы grades, её rowid служит глобальным
+    номером записи. Запись идёт в транзакции BEGIN IMMEDIATE: SQLite
+    пропускает писателей по одному, и к ответу клиенту запись уже видна
+    любому процессу. Читатели в WAL не ждут писателя и догоняют базу
+    по номерам: since(seq) отдаёт только новые оценки.
+
+    Таблица handoff хранит номера последних записей в журнале одиночного
+    режима и в самой базе на момент последней передачи данных между ними
+    (см. server.hand_over).
+    """
+
+    def __init__(self, path, sync_writes=False):
+        self._path = path
+        self._lock = threading.Lock()
+        # isolation_level=None: транзакциями управляем сами.
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # В WAL режим NORMAL не теряет данных при падении процесса, а FULL
+        # дополнительно делает fsync на каждую транзакцию.
+        self._conn.execute(f"PRAGMA synchronous={'FULL' if sync_writes else 'NORMAL'}")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS subjects (
+                id INTEGER PRIMARY KEY,
+                title TEXT NOT NULL UNIQUE
+            );
+            CREATE TABLE IF NOT EXISTS grades (
+                seq INTEGER PRIMARY KEY,
+                subject_id INTEGER NOT NULL REFERENCES subjects(id),
+                grade INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS handoff (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                journal_seq INTEGER NOT NULL,
+                store_seq INTEGER NOT NULL
+            );
+            """
+        )
+
+    def last_seq(self):
+        """Номер последней записанной оценки (0 для пустой базы)."""
+        with self._lock:
+            return self._conn.execute("SELECT coalesce(max(seq), 0) FROM grades").fetchone()[0]
+
+    def since(self, seq):
+        """Записи журнала с номером больше seq в порядке номеров."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT g.seq, g.subject_id, s.title, g.grade FROM grades g"
+                " JOIN subjects s ON s.id = g.subject_id WHERE g.seq > ? ORDER BY g.seq",
+                (seq,),
+            ).fetchall()
+        return [{"seq": s, "id": i, "title": t, "grade": g} for s, i, t, g in rows]
+
+    def add(self, title, grade):
+        """Атомарно добавляет оценку и возвращает её запись журнала."""
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                cur.execute("INSERT OR IGNORE INTO subjects (title) VALUES (?)", (title,))
+                subject_id = cur.execute(
+                    "SELECT id FROM subjects WHERE title = ?", (title,)
+                ).fetchone()[0]
+                cur.execute(
+                    "INSERT INTO grades (subject_id, grade) VALUES (?, ?)", (subject_id, grade)
+                )
+                seq = cur.lastrowid
+                cur.execute("COMMIT")
+            except BaseException:
+                cur.execute("ROLLBACK")
+                raise
+        return {"seq": seq, "id": subject_id, "title": title, "grade": grade}
+
+    def handoff(self):
+        """(номер в журнале, номер в базе) при последней передаче или None."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT journal_seq, store_seq FROM handoff WHERE id = 1"
+            ).fetchone()
+
+    def set_handoff(self, journal_seq):
+        """Запоминает, что база и журнал с номером journal_seq совпадают."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO handoff VALUES (1, ?, (SELECT coalesce(max(seq), 0) FROM grades))",
+                (journal_seq,),
+            )
+
+    def subjects(self):
+        """Все предметы по id с оценками в порядке записи."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT s.id, s.title, g.grade FROM subjects s"
+                " LEFT JOIN grades g ON g.subject_id = s.id ORDER BY s.id, g.seq"
+            ).fetchall()
+        subjects = {}
+        for subject_id, title, grade in rows:
+            subject = subjects.setdefault(subject_id, {"id": subject_id, "title": title, "grades": []})
+            if grade is not None:
+                subject["grades"].append(grade)
+        return list(subjects.values())
+
+    def replace_subjects(self, subjects, journal_seq):
+        """Заменяет содержимое базы предметами из журнала с номером journal_seq.
+
+        Замена и отметка о передаче идут в одной транзакции: после падения
+        посередине база остаётся прежней и с прежней отметкой.
+        """
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                cur.execute("DELETE FROM grades")
+                cur.execute("DELETE FROM subjects")
+                for subject in subjects:
+                    cur.execute(
+                        "INSERT INTO subjects (id, title) VALUES (?, ?)",
+                        (subject["id"], subject["title"]),
+                    )
+                    cur.executemany(
+                        "INSERT INTO grades (subject_id, grade) VALUES (?, ?)",
+                        [(subject["id"], grade) for grade in subject["grades"]],
+                    )
+                cur.execute(
+                    "INSERT OR REPLACE INTO handoff VALUES (1, ?, (SELECT coalesce(max(seq), 0) FROM grades))",
+                    (journal_seq,),
+                )
+                cur.execute("COMMIT")
+            except BaseException:
+                cur.execute("ROLLBACK")
+                raise
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
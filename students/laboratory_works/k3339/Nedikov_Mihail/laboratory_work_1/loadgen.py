@@ -0,0 +1,386 @@
+import argparse
+import asyncio
+import math
+import os
+import random
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BASE_DIR, "Task 1"))
+from rpc import HEADER, REQUEST_TAG, RESPONSE_TAG  # noqa: E402
+
+# Общий нагрузочный клиент для серверов лабораторной. Запуск:
+#   python loadgen.py udp|tcp|static|grades [параметры]
+# Сервер запускается отдельно, например:
+#   Task 1: python server.py fast        Task 2: python server.py
+#   Task 3: python server.py             Task 5: python server.py localhost 8080 lab asyncio
+# Соединения берутся из пула, concurrency задач отправляют запросы пачками
+# по depth штук (конвейер), задержка каждого запроса попадает в гистограмму.
+SUB_BITS = 7  # 128 линейных подкорзин на октаву: ошибка значения меньше 1%
+PERCENTILES = (50, 90, 99, 99.9, 99.99)
+USER_AGENT = "lab1-loadgen"
+
+# Смесь запросов по умолчанию; вес задаётся суффиксом *N.
+DEFAULT_MIX = {
+    "udp": "Hello, server",
+    "tcp": "3 4*4,5 12*4,1e6 1e-6,-1 2",
+    "static": "GET /*9,GET /missing.html",
+    "grades": "GET /grades*8,GET /*2,POST /set_subject?title=load&grade=5",
+}
+
+
+class Histogram:
+    """Гистограмма задержек в микросекундах в духе HdrHistogram.
+
+    Значения делятся на октавы по степеням двойки, каждая октава — на
+    2**(sub_bits - 1) равных корзин, поэтому относительная ошибка одна и та
+    же для микросекунд и секунд, а память не зависит от числа замеров.
+    """
+
+    def __init__(self, sub_bits=SUB_BITS):
+        self.sub_bits = sub_bits
+        self.counts = {}  # номер корзины -> число замеров
+        self.total = 0
+        self.max = 0
+
+    def record(self, value):
+        value = int(value)
+        shift = max(value.bit_length() - self.sub_bits, 0)
+        index = (shift << self.sub_bits) | (value >> shift)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.total += 1
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def highest(self, index):
+        """Наибольшее значение, попадающее в корзину index."""
+        shift = index >> self.sub_bits
+        low = index & ((1 << self.sub_bits) - 1)
+        return min(((low + 1) << shift) - 1, self.max)
+
+    def percentile(self, p):
+        if not self.total:
+            return 0
+        target = max(1, math.ceil(self.total * p / 100))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return self.highest(index)
+        return self.max
+
+    def distribution(self):
+        """Строки (значение, процентиль, накоплено) по всем непустым корзинам."""
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            yield self.highest(index), seen / self.total, seen
+
+
+def parse_mix(spec):
+    """Разбирает "запрос*вес,запрос" в список запросов и список весов."""
+    requests, weights = [], []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        request, star, weight = item.rpartition("*")
+        if not star or not weight.isdigit():
+            request, weight = item, "1"
+        requests.append(request)
+        weights.append(int(weight))
+    return requests, weights
+
+
+class UdpConnection:
+    """UDP-сокет с протоколом Task 1/rpc.py: ответы сопоставляются по номеру."""
+
+    class Protocol(asyncio.DatagramProtocol):
+        def __init__(self, waiting):
+            self.waiting = waiting
+
+        def datagram_received(self, data, addr):
+            if len(data) < HEADER.size or data[:2] != RESPONSE_TAG:
+                return
+            future = self.waiting.pop(HEADER.unpack_from(data)[1], None)
+            if future is not None and not future.done():
+                future.set_result(200)
+
+        def error_received(self, exc):
+            for future in self.waiting.values():
+                if not future.done():
+                    future.set_exception(exc)
+            self.waiting.clear()
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.transport = None
+        self.waiting = {}  # seq -> future
+        self.seq = 0
+
+    @staticmethod
+    def build(request, host):
+        return request.encode()
+
+    async def exchange(self, payloads, on_reply):
+        if self.transport is None:
+            loop = asyncio.get_running_loop()
+            self.transport, _ = await loop.create_datagram_endpoint(
+                lambda: self.Protocol(self.waiting), remote_addr=(self.host, self.port)
+            )
+        futures = []
+        for payload in payloads:
+            self.seq = (self.seq + 1) % 2**32
+            future = asyncio.get_running_loop().create_future()
+            future.add_done_callback(lambda f: f.cancelled() or f.exception() or on_reply(f.result()))
+            self.waiting[self.seq] = future
+            futures.append(future)
+            self.transport.sendto(HEADER.pack(REQUEST_TAG, self.seq) + payload)
+        try:
+            await asyncio.gather(*futures)
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+        self.transport = None
+        self.waiting.clear()
+
+
+class LineConnection:
+    """TCP-соединение с построчным протоколом Task 2."""
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    @staticmethod
+    def build(request, host):
+        return request.encode() + b"\n"
+
+    async def exchange(self, payloads, on_reply):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write(b"".join(payloads))
+        await self.writer.drain()
+        for _ in payloads:
+            await self.reader.readuntil(b"\n")
+            on_reply(200)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+class HttpConnection(LineConnection):
+    """Постоянное HTTP/1.1-соединение с конвейером запросов.
+
+    Если сервер ответил Connection: close, оставшиеся запросы пачки им не
+    обработаны (RFC 9112, 9.6) и отправляются заново в новом соединении —
+    так работает и сервер Task 3, закрывающий соединение после ответа.
+    """
+
+    @staticmethod
+    def build(request, host):
+        method, _, target = request.partition(" ")
+        return (
+            f"{method} {target} HTTP/1.1\r\nHost: {host}\r\nUser-Agent: {USER_AGENT}\r\n"
+            "Content-Length: 0\r\n\r\n"
+        ).encode()
+
+    async def exchange(self, payloads, on_reply):
+        while payloads:
+            if self.writer is None:
+                self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+            self.writer.write(b"".join(payloads))
+            await self.writer.drain()
+            while payloads:
+                status, keep_alive = await self.read_response()
+                payloads = payloads[1:]
+                on_reply(status)
+                if not keep_alive:
+                    self.close()
+                    break
+
+    async def read_response(self):
+        """Читает один ответ целиком; возвращает (статус, соединение живо)."""
+        head = await self.reader.readuntil(b"\r\n\r\n")
+        lines = head.decode("iso-8859-1").split("\r\n")
+        status = int(lines[0].split()[1])
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip().lower()
+        if headers.get("transfer-encoding") == "chunked":
+            while True:
+                size = int((await self.reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                await self.reader.readexactly(size + 2)
+                if not size:
+                    break
+        elif "content-length" in headers:
+            await self.reader.readexactly(int(headers["content-length"]))
+        elif status >= 200 and status not in (204, 304):
+            await self.reader.read()  # тело до закрытия соединения
+            return status, False
+        return status, headers.get("connection") != "close"
+
+
+TARGETS = {
+    "udp": UdpConnection,
+    "tcp": LineConnection,
+    "static": HttpConnection,
+    "grades": HttpConnection,
+}
+
+
+class LoadGenerator:
+    """Пул соединений, задачи-клиенты и сбор статистики одного прогона.
+
+    С rate задержка считается от запланированного момента отправки, а не от
+    фактического: если сервер тормозит, очередь ожидания тоже попадает в
+    замер (поправка на coordinated omission, как в wrk2).
+    """
+
+    def __init__(self, target, host, port, connections, concurrency, depth, mix,
+                 timeout, rate=None, seed=None):
+        connection_class = TARGETS[target]
+        requests, self.weights = parse_mix(mix or DEFAULT_MIX[target])
+        self.requests = [connection_class.build(request, host) for request in requests]
+        self.make_connection = lambda: connection_class(host, port)
+        self.connections = connections
+        self.concurrency = concurrency
+        self.depth = depth
+        self.timeout = timeout
+        self.rate = rate
+        self.random = random.Random(seed)
+        self.histogram = Histogram()
+        self.statuses = {}
+        self.errors = 0
+        self.completed = 0
+        self.recording = False
+
+    def on_reply(self, started):
+        """Возвращает колбэк, отмечающий ответ на запрос, отправленный в started."""
+        def record(status):
+            if self.recording:
+                self.histogram.record((time.perf_counter() - started) * 1e6)
+                self.statuses[status] = self.statuses.get(status, 0) + 1
+                self.completed += 1
+        return record
+
+    async def client(self, pool, stop_at, schedule):
+        while time.perf_counter() < stop_at:
+            batch = self.random.choices(self.requests, self.weights, k=self.depth)
+            if schedule is not None:
+                started = schedule.send(None)
+                delay = started - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            conn = await pool.get()
+            if schedule is None:
+                started = time.perf_counter()
+            replies = 0
+
+            def count(status, record=self.on_reply(started)):
+                nonlocal replies
+                replies += 1
+                record(status)
+
+            try:
+                await asyncio.wait_for(conn.exchange(batch, count), self.timeout)
+            except (OSError, EOFError, ValueError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+                conn.close()
+                if self.recording:
+                    self.errors += len(batch) - replies
+            finally:
+                pool.put_nowait(conn)
+
+    async def run(self, duration, warmup=0.0):
+        pool = asyncio.Queue()
+        for _ in range(self.connections):
+            pool.put_nowait(self.make_connection())
+        schedule = None
+        if self.rate:
+            # Общий план отправок: пачка за пачкой через равные промежутки.
+            def plan(start, interval):
+                n = 0
+                while True:
+                    yield start + n * interval
+                    n += 1
+            schedule = plan(time.perf_counter(), self.depth / self.rate)
+        begin = time.perf_counter()
+        stop_at = begin + warmup + duration
+        clients = [
+            asyncio.create_task(self.client(pool, stop_at, schedule))
+            for _ in range(self.concurrency)
+        ]
+        await asyncio.sleep(warmup)
+        self.recording = True
+        measured_from = time.perf_counter()
+        await asyncio.gather(*clients)
+        self.recording = False
+        elapsed = time.perf_counter() - measured_from
+        while not pool.empty():
+            pool.get_nowait().close()
+        return elapsed
+
+
+def report(gen, elapsed, hdr=False):
+    h = gen.histogram
+    print(f"  запросов: {gen.completed}, ошибок: {gen.errors}, {gen.completed / elapsed:.0f} запросов/с")
+    if len(gen.statuses) > 1 or 200 not in gen.statuses:
+        print("  статусы: " + ", ".join(f"{s}: {n}" for s, n in sorted(gen.statuses.items())))
+    print("  задержка, мкс: " + ", ".join(
+        f"p{p:g} {h.percentile(p)}" for p in PERCENTILES
+    ) + f", max {h.max}")
+    if hdr:
+        # Формат распределения как у HdrHistogram: значение, процентиль,
+        # накопленное число и 1/(1-процентиль).
+        print(f"{'Value':>12} {'Percentile':>14} {'TotalCount':>10} {'1/(1-Percentile)':>16}")
+        for value, fraction, seen in h.distribution():
+            inverse = f"{1 / (1 - fraction):16.2f}" if fraction < 1 else f"{'inf':>16}"
+            print(f"{value:12d} {fraction:14.12f} {seen:10d} {inverse}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный клиент для серверов лабораторной 1")
+    parser.add_argument("target", choices=sorted(TARGETS))
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("-d", "--duration", type=float, default=5.0, help="секунд замера")
+    parser.add_argument("--warmup", type=float, default=1.0, help="секунд прогрева без замера")
+    parser.add_argument("-c", "--connections", type=int, default=16, help="размер пула соединений")
+    parser.add_argument("-n", "--concurrency", type=int, default=16, help="одновременных клиентов")
+    parser.add_argument("--depth", type=int, default=1, help="запросов в одной конвейерной пачке")
+    parser.add_argument("--mix", help='смесь запросов, например "GET /grades*8,GET /"')
+    parser.add_argument("--rate", type=float, help="постоянная нагрузка, запросов/с (открытая модель)")
+    parser.add_argument("--timeout", type=float, default=5.0, help="таймаут пачки, секунд")
+    parser.add_argument("--seed", type=int, default=1, help="зерно выбора запросов из смеси")
+    parser.add_argument("--hdr", action="store_true", help="напечатать распределение задержек")
+    args = parser.parse_args()
+
+    gen = LoadGenerator(
+        args.target, args.host, args.port, args.connections, args.concurrency,
+        args.depth, args.mix, args.timeout, args.rate, args.seed,
+    )
+    print(
+        f"{args.target} {args.host}:{args.port}: пул {args.connections}, клиентов "
+        f"{args.concurrency}, конвейер {args.depth}, {args.duration} с"
+        + (f", {args.rate:g} запросов/с" if args.rate else "")
+    )
+    elapsed = asyncio.run(gen.run(args.duration, args.warmup))
+    report(gen, elapsed, args.hdr)
+
+
+if __name__ == "__main__":
+    main()